@@ -0,0 +1,130 @@
+import os
+import re
+from typing import Optional
+from app.ai.classify_email import classify_email, OutputFormat
+from app.ai.extract_username_agent import (
+    extract_username_agent,
+    OutputFormatExtractName,
+)
+from app.helpers.email_normalization import split_quoted_history, strip_signature
+from app.helpers.metrics import incr_metric
+
+
+# Below this confidence the LLM is called instead
+FAST_PATH_MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.8"))
+FAST_PATH_METRIC = "fast_path"
+
+_forward_subject_pattern = re.compile(r"^\s*(fwd?|fw)\s*:", re.IGNORECASE)
+_forward_body_pattern = re.compile(
+    r"-{3,}\s*forwarded message\s*-{3,}|begin forwarded message:|-{3,}\s*original message\s*-{3,}",
+    re.IGNORECASE,
+)
+_question_start_pattern = re.compile(
+    r"^\s*(what|when|where|who|whom|whose|which|why|how|do|does|did|is|are|was|were|"
+    r"can|could|should|would|will|have|has|remind me|tell me|find|show me)\b",
+    re.IGNORECASE,
+)
+_my_name_is_pattern = re.compile(
+    r"\b(?i:my name is)\s+([A-Z][a-zA-Z'-]+(?:\s+[A-Z][a-zA-Z'-]+)?)"
+)
+# "I am Happy to..." also matches, so this alone is not trusted
+_self_intro_pattern = re.compile(
+    r"\b(?i:i am|i'm|this is)\s+([A-Z][a-zA-Z'-]+(?:\s+[A-Z][a-zA-Z'-]+)?)"
+)
+_sign_off_pattern = re.compile(
+    r"^\s*(?:regards|best regards|kind regards|thanks|thank you|cheers|best|sincerely)[,!.]?\s*\n\s*"
+    r"([A-Z][a-zA-Z'-]+(?:\s+[A-Z][a-zA-Z'-]+)?)\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_display_name_pattern = re.compile(r"^[^\W\d_][^\W\d_'. -]*(?:[ '.-]+[^\W\d_]+){0,3}$")
+
+
+def fast_classify(subject: str, text: str) -> tuple[Optional[str], float]:
+    """
+    Deterministic SAVE/QA guess from subject and body features.
+    Body features are taken from the sender's own text, a short question sent as a reply
+    to a long thread is still a question.
+    Returns:
+        (action or None, confidence between 0 and 1)
+    """
+    if _forward_subject_pattern.match(subject or "") or _forward_body_pattern.search(
+        text
+    ):
+        return "SAVE", 0.95
+
+    own_text, _history = split_quoted_history(text)
+    body = strip_signature(own_text)
+    if not body:
+        return None, 0.0
+
+    first_line = body.splitlines()[0]
+    is_short = len(body) <= 300
+    ends_with_question = body.rstrip().endswith("?")
+    starts_like_question = bool(_question_start_pattern.match(first_line))
+
+    if is_short and ends_with_question and starts_like_question:
+        return "QA", 0.9
+    if is_short and (ends_with_question or starts_like_question):
+        return "QA", 0.7
+    if len(body) > 1500 and body.count("?") <= 1:
+        # Long bodies without questions are almost always notes or pasted content
+        return "SAVE", 0.85
+    return None, 0.0
+
+
+def fast_extract_name(from_name: Optional[str], text: str) -> tuple[str, float]:
+    """
+    Deterministic name guess from the From header display name or the email text.
+    Returns:
+        (name or "", confidence between 0 and 1)
+    """
+    if from_name:
+        name = from_name.strip().strip('"').strip()
+        if "@" not in name and _display_name_pattern.match(name):
+            return name, 0.95
+
+    match = _my_name_is_pattern.search(text)
+    if match:
+        return match.group(1), 0.85
+
+    match = _sign_off_pattern.search(text)
+    if match:
+        return match.group(1), 0.75
+
+    match = _self_intro_pattern.search(text)
+    if match:
+        return match.group(1), 0.5
+
+    return "", 0.0
+
+
+async def classify_email_with_fast_path(
+    subject: str, text_body: str, llm_input: str
+) -> OutputFormat:
+    """
+    Classify locally from the raw body when confident,
+    otherwise fall back to the classify_email LLM call with llm_input.
+    """
+    action, confidence = fast_classify(subject, text_body)
+    if action and confidence >= FAST_PATH_MIN_CONFIDENCE:
+        await incr_metric(FAST_PATH_METRIC, "classify_hits")
+        return OutputFormat(action=action)
+
+    await incr_metric(FAST_PATH_METRIC, "classify_llm_calls")
+    return await classify_email(llm_input)
+
+
+async def extract_username_with_fast_path(
+    from_name: Optional[str], text_body: str, llm_input: str
+) -> OutputFormatExtractName:
+    """
+    Extract the name locally from the header or raw body when confident,
+    otherwise fall back to extract_username_agent with llm_input.
+    """
+    name, confidence = fast_extract_name(from_name, text_body)
+    if name and confidence >= FAST_PATH_MIN_CONFIDENCE:
+        await incr_metric(FAST_PATH_METRIC, "username_hits")
+        return OutputFormatExtractName(username=name)
+
+    await incr_metric(FAST_PATH_METRIC, "username_llm_calls")
+    return await extract_username_agent(llm_input)
@@ -1,23 +1,27 @@
 from datetime import datetime
 from pydantic import BaseModel
-from app.gemini.llm import llm
+from app.gemini.llm import llm, llm_stream
 from google.genai import types
 from enum import Enum
-from typing import Literal, Any
+from typing import Literal, Any, AsyncIterator
 
 
 class AnswerOutputFormat(BaseModel):
     answer: str
 
 
-async def qa_agent(question: str, knowledge_base: str) -> AnswerOutputFormat:
-    """
-    Gemini model to do question answer based on knowledge_base
-    """
+def build_qa_system_instruction(knowledge_base: str, json_output: bool = True) -> str:
     today_date: str = datetime.now().strftime("%Y-%m-%d")
     today_time: str = datetime.now().strftime("%H:%M:%S")
 
-    system_instruction: str = f"""
+    output_instruction: str = (
+        """The Output must be a JSON in the following format
+    {"answer": "str"}"""
+        if json_output
+        else "The Output must be plain text, the answer only."
+    )
+
+    return f"""
     You are a helpful assistant.
     You will be provided with a knowledge_base and user_question.
     Your task is to answer user question from the knowledge base. 
@@ -25,8 +29,7 @@ async def qa_agent(question: str, knowledge_base: str) -> AnswerOutputFormat:
     Always Priorotize to answer from the given knowledge base.
     Keep your tone friendly.
 
-    The Output must be a JSON in the following format
-    {{"answer": "str"}}
+    {output_instruction}
 
     KNOWLEDGE BASE STARTS
     Knowledge Base = {knowledge_base}
@@ -38,6 +41,13 @@ async def qa_agent(question: str, knowledge_base: str) -> AnswerOutputFormat:
     KNOWLEDGE BASE ENDS
     """
 
+
+async def qa_agent(question: str, knowledge_base: str) -> AnswerOutputFormat:
+    """
+    Gemini model to do question answer based on knowledge_base
+    """
+    system_instruction: str = build_qa_system_instruction(knowledge_base)
+
     config: types.GenerateContentConfig = types.GenerateContentConfig(
         system_instruction=system_instruction,
         response_mime_type="application/json",
@@ -51,6 +61,20 @@ async def qa_agent(question: str, knowledge_base: str) -> AnswerOutputFormat:
             return parsed_res
     raise Exception("Error in qa agent")
 
+
+async def qa_agent_stream(question: str, knowledge_base: str) -> AsyncIterator[str]:
+    """
+    Same as qa_agent but yields the plain text answer as it is generated
+    """
+    config: types.GenerateContentConfig = types.GenerateContentConfig(
+        system_instruction=build_qa_system_instruction(
+            knowledge_base, json_output=False
+        ),
+    )
+    async for text in llm_stream(question, config):
+        yield text
+
+
 async def main() -> None:
     try:
         knowledgebase = """
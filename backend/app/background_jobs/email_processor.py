@@ -1,59 +1,253 @@
 import asyncio
+import base64
+import os
+import tempfile
 import uuid
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
 from uuid import UUID
 from datetime import datetime
-from fastapi import BackgroundTasks
-from app.helpers.chunk_email_text import split_text_recursive
-from app.gemini.get_embeddings import get_embeddings
-from app.lance_db import TextEmbeddingSchema, add_record
+from app.database.database import Database
+from app.helpers.attachment_text import document_page_count, extract_pages_text
+from app.helpers.text_preparation import prepare_text_chunks, remove_links_async
+from app.gemini.get_embeddings import get_embeddings_batch, GEMINI_EMBEDDING_BATCH_LIMIT
+from app.gemini.embedding_cache import normalize_text
+from app.helpers.metrics import incr_metric
+from app.lance_db import (
+    TextEmbeddingSchema,
+    add_record,
+    delete_attachment_records,
+    delete_records_by_email_ref_ids,
+    get_chunk_texts,
+)
+from app.service.answer_cache import bump_kb_version
+from app.service.email.attachments import (
+    ATTACHMENT_EXTRACT_TIMEOUT_SECONDS,
+    ATTACHMENT_MAX_PAGES,
+    ATTACHMENT_METRIC,
+    ATTACHMENT_PAGE_BATCH,
+    AttachmentPool,
+)
+from app.service.email.normalize import remember_paragraphs
+from app.service.email.dedupe import (
+    DEDUPE_ENABLED,
+    DEDUPE_METRIC,
+    DEDUPE_SKIP_SIMILARITY,
+    compute_signature,
+    find_near_duplicate,
+    link_duplicate,
+    store_signature,
+)
+
+
+async def embed_chunks(
+    email_ref_id: str,
+    chunks: list[tuple[int, str]],
+    created_at: datetime,
+    attachment_name: Optional[str] = None,
+) -> list[TextEmbeddingSchema]:
+    """
+    Embed (chunk_sequence, text) pairs in one batch request
+    """
+    embeddings = await get_embeddings_batch([text for _, text in chunks])
+    return [
+        TextEmbeddingSchema(
+            id=str(uuid.uuid4()),
+            email_ref_id=email_ref_id,
+            vector=embedding,
+            text=text,
+            chunk_sequence=sequence,
+            created_at=created_at,
+            attachment_name=attachment_name,
+        )
+        for (sequence, text), embedding in zip(chunks, embeddings)
+    ]
+
+
+async def email_exists(email_ref_id: str) -> bool:
+    return bool(await Database.fetchval("SELECT 1 FROM emails WHERE id = $1", email_ref_id))
 
 
 async def process_email_background(
-    user_id: UUID,
+    user_id: UUID | str,
     email_ref_id: str,
     email_subject: str,
     text_body: str,
+    paragraph_fingerprints: Optional[list[str]] = None,
 ) -> None:
     """
     Background job function to process emails asynchronously.
-    This function will run in the background without blocking the main request.
+    Jobs are queued by the API and run by the worker process in app.background_jobs.worker
     """
     print("Hello world from background job!")
     print(f"Processing email for email_ref_id {email_ref_id}")
     print(f"Subject: {email_subject}")
 
-    text_chunks = split_text_recursive(text_body)
+    table_name = str(user_id)
+    signature = None
+    known_chunks: set[str] = set()
+    if DEDUPE_ENABLED:
+        signature = await compute_signature(text_body)
+        duplicate = await find_near_duplicate(table_name, email_ref_id, signature)
+        if duplicate is not None:
+            await link_duplicate(table_name, email_ref_id, duplicate)
+            if duplicate.similarity >= DEDUPE_SKIP_SIMILARITY:
+                print(
+                    f"Email {email_ref_id} is a near duplicate of {duplicate.email_ref_id} "
+                    f"(similarity {duplicate.similarity:.2f}), skipping"
+                )
+                await incr_metric(DEDUPE_METRIC, "skipped_emails")
+                # The content is embedded under the linked email
+                await remember_paragraphs(table_name, email_ref_id, paragraph_fingerprints or [])
+                return
+            # Only embed what the similar email doesn't already cover
+            known_chunks = {
+                normalize_text(text)
+                for text in await get_chunk_texts(table_name, duplicate.email_ref_id)
+            }
+            await incr_metric(DEDUPE_METRIC, "partial_emails")
 
-    for index, chunk in enumerate(text_chunks):
-        embedding = await get_embeddings(chunk)
-        print(f"Embedding of index {index}: {embedding}")
-        lance_item = TextEmbeddingSchema(
-            id=str(uuid.uuid4()),
-            email_ref_id=email_ref_id,
-            vector=embedding,
-            text=chunk,
-            chunk_sequence=index,
-            created_at=datetime.now(),
-        )
-        table_name = str(user_id)
-        await add_record(table_name, [lance_item])
+    # Chunks are embedded one Gemini batch at a time as the splitter produces them.
+    # Chunks keep their position in the email even when known ones are skipped
+    created_at = datetime.now()
+    lance_items: list[TextEmbeddingSchema] = []
+    batch: list[tuple[int, str]] = []
+    skipped_chunks = 0
+    sequence = 0
+    async for chunk in prepare_text_chunks(text_body):
+        if known_chunks and normalize_text(chunk) in known_chunks:
+            skipped_chunks += 1
+        else:
+            batch.append((sequence, chunk))
+        sequence += 1
+        if len(batch) == GEMINI_EMBEDDING_BATCH_LIMIT:
+            lance_items.extend(await embed_chunks(email_ref_id, batch, created_at))
+            batch = []
+    if batch:
+        lance_items.extend(await embed_chunks(email_ref_id, batch, created_at))
+    if skipped_chunks:
+        await incr_metric(DEDUPE_METRIC, "skipped_chunks", skipped_chunks)
+    if not lance_items:
+        print(f"No text chunks to process for email {email_subject}")
+        return
+    print(f"Got {len(lance_items)} embeddings for email_ref_id {email_ref_id}")
+
+    # The email may have been deleted through /kb while it waited in the queue
+    if not await email_exists(email_ref_id):
+        print(f"Email {email_ref_id} was deleted, skipping")
+        return
+    # Chunks of an earlier run of this job (redelivered or queued again by a retried
+    # inbound job) are replaced. All chunks are written in one go, a retried job never
+    # leaves half an email behind
+    if not await delete_records_by_email_ref_ids(table_name, [email_ref_id], bodies_only=True):
+        raise Exception(f"Failed to delete earlier chunks of email {email_ref_id}")
+    await add_record(table_name, lance_items)
+    await remember_paragraphs(table_name, email_ref_id, paragraph_fingerprints or [])
+    if signature is not None:
+        await store_signature(table_name, email_ref_id, signature)
+    # New knowledge can change answers, invalidate the user's answer cache
+    await bump_kb_version(table_name)
     print(f"Background processing completed for email {email_subject}")
 
 
-def add_email_processing_task(
-    background_tasks: BackgroundTasks,
-    user_id: UUID,
+
+async def process_attachment_background(
+    user_id: UUID | str,
     email_ref_id: str,
     email_subject: str,
-    text_body: str,
+    attachment_name: str,
+    filetype: str,
+    content: str,
 ) -> None:
     """
-    Helper function to add the email processing task to FastAPI's background tasks.
+    Extract the text of a document attachment and embed it under the email.
+    Pages are extracted ATTACHMENT_PAGE_BATCH at a time in the attachment process pool
+    from a temporary file, and each batch is embedded and written before the next one is
+    read, so not all of the document's text sits in memory.
+    A document that is unreadable, crashes the parser or times out is not retried,
+    it would fail the same way again.
     """
-    background_tasks.add_task(
-        process_email_background,
-        user_id,
-        email_ref_id,
-        email_subject,
-        text_body,
-    )
+    print(f"Processing attachment {attachment_name} of email_ref_id {email_ref_id}")
+    table_name = str(user_id)
+
+    file_descriptor, path = tempfile.mkstemp(suffix=f".{filetype}")
+    try:
+        try:
+            # binascii.Error from a malformed payload is a ValueError
+            with os.fdopen(file_descriptor, "wb") as file:
+                file.write(base64.b64decode(content, validate=True))
+            page_count = await AttachmentPool.run(
+                document_page_count,
+                path,
+                filetype,
+                timeout=ATTACHMENT_EXTRACT_TIMEOUT_SECONDS,
+            )
+        except (ValueError, BrokenProcessPool, asyncio.TimeoutError) as e:
+            print(f"Skipping attachment {attachment_name}: {e!r}")
+            await incr_metric(ATTACHMENT_METRIC, "unreadable")
+            return
+        if page_count > ATTACHMENT_MAX_PAGES:
+            print(
+                f"Attachment {attachment_name} has {page_count} pages, "
+                f"indexing the first {ATTACHMENT_MAX_PAGES}"
+            )
+            await incr_metric(ATTACHMENT_METRIC, "truncated")
+        pages = min(page_count, ATTACHMENT_MAX_PAGES)
+
+        if not await email_exists(email_ref_id):
+            print(f"Email {email_ref_id} was deleted, skipping attachment")
+            return
+        # A retried job starts over, chunks written by the failed attempt are dropped
+        await delete_attachment_records(table_name, email_ref_id, attachment_name)
+
+        created_at = datetime.now()
+        sequence = 0
+        for start in range(0, pages, ATTACHMENT_PAGE_BATCH):
+            try:
+                page_texts = await AttachmentPool.run(
+                    extract_pages_text,
+                    path,
+                    filetype,
+                    start,
+                    min(start + ATTACHMENT_PAGE_BATCH, pages),
+                    timeout=ATTACHMENT_EXTRACT_TIMEOUT_SECONDS,
+                )
+            except (ValueError, BrokenProcessPool, asyncio.TimeoutError) as e:
+                # Pages already written stay indexed
+                print(f"Stopping attachment {attachment_name} at page {start}: {e!r}")
+                await incr_metric(ATTACHMENT_METRIC, "failed")
+                pages = start
+                break
+            text = await remove_links_async("\n\n".join(page_texts))
+            lance_items: list[TextEmbeddingSchema] = []
+            batch: list[tuple[int, str]] = []
+            async for chunk in prepare_text_chunks(text):
+                batch.append((sequence, chunk))
+                sequence += 1
+                if len(batch) == GEMINI_EMBEDDING_BATCH_LIMIT:
+                    lance_items.extend(
+                        await embed_chunks(email_ref_id, batch, created_at, attachment_name)
+                    )
+                    batch = []
+            if batch:
+                lance_items.extend(
+                    await embed_chunks(email_ref_id, batch, created_at, attachment_name)
+                )
+            if not lance_items:
+                continue
+            if not await email_exists(email_ref_id):
+                print(f"Email {email_ref_id} was deleted, stopping attachment")
+                await delete_attachment_records(table_name, email_ref_id, attachment_name)
+                return
+            await add_record(table_name, lance_items)
+
+        await incr_metric(ATTACHMENT_METRIC, "documents")
+        await incr_metric(ATTACHMENT_METRIC, "pages", pages)
+        await incr_metric(ATTACHMENT_METRIC, "chunks", sequence)
+        # Also when nothing was embedded, a failed attempt's chunks may have been deleted
+        await bump_kb_version(table_name)
+        print(
+            f"Embedded {sequence} chunks from {pages} pages of attachment {attachment_name}"
+        )
+    finally:
+        os.unlink(path)
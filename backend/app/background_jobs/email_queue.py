@@ -0,0 +1,70 @@
+import os
+from typing import Optional
+from uuid import UUID
+from app.background_jobs.stream_queue import StreamQueue
+
+
+# Saved emails waiting to be chunked, embedded and written to LanceDB
+email_processing_queue = StreamQueue(
+    os.getenv("EMAIL_QUEUE_STREAM", "email_processing"),
+    os.getenv("EMAIL_QUEUE_GROUP", "email_workers"),
+)
+
+
+async def enqueue_email_processing_task(
+    user_id: UUID | str,
+    email_ref_id: str,
+    email_subject: str,
+    text_body: str,
+    paragraph_fingerprints: Optional[list[str]] = None,
+) -> str:
+    """
+    Push an email processing job to the ingestion stream.
+    paragraph_fingerprints are recorded once the chunks are written, see remember_paragraphs.
+    Returns:
+        The stream message id
+    """
+    return await email_processing_queue.enqueue(
+        {
+            "user_id": str(user_id),
+            "email_ref_id": email_ref_id,
+            "email_subject": email_subject,
+            "text_body": text_body,
+            "paragraph_fingerprints": ",".join(paragraph_fingerprints or []),
+        }
+    )
+
+
+# Document attachments of saved emails waiting for text extraction and embedding
+attachment_processing_queue = StreamQueue(
+    os.getenv("ATTACHMENT_QUEUE_STREAM", "attachment_processing"),
+    os.getenv("ATTACHMENT_QUEUE_GROUP", "attachment_workers"),
+    # Each entry carries a file of up to ATTACHMENT_MAX_BYTES
+    dead_letter_maxlen=int(os.getenv("ATTACHMENT_QUEUE_DEAD_LETTER_MAXLEN", "100")),
+)
+
+
+async def enqueue_attachment_processing_task(
+    user_id: UUID | str,
+    email_ref_id: str,
+    email_subject: str,
+    attachment_name: str,
+    filetype: str,
+    content: str,
+) -> str:
+    """
+    Push an attachment processing job to the attachment stream.
+    content is the base64 encoded file as received from Postmark.
+    Returns:
+        The stream message id
+    """
+    return await attachment_processing_queue.enqueue(
+        {
+            "user_id": str(user_id),
+            "email_ref_id": email_ref_id,
+            "email_subject": email_subject,
+            "attachment_name": attachment_name,
+            "filetype": filetype,
+            "content": content,
+        }
+    )
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+from typing import Any
+from app.database.redis_connect import RedisConnection
+from app.background_jobs.stream_queue import StreamQueue
+from app.background_jobs.email_queue import enqueue_email_processing_task
+from app.service.email.create import create_email
+from app.service.get_user_by_email import get_user_by_email
+from app.service.create_user import create_user_service
+from app.service.answer_question import answer_question
+from app.ai.classify_email import OutputFormat
+from app.ai.extract_username_agent import OutputFormatExtractName
+from app.ai.fast_path import (
+    classify_email_with_fast_path,
+    extract_username_with_fast_path,
+)
+from app.helpers.text_preparation import remove_links_async
+from app.helpers.email_normalization import html_to_text, paragraph_fingerprints
+from app.service.email.normalize import normalize_email_body
+from app.service.email.attachments import (
+    enqueue_document_attachments,
+    strip_unused_attachments,
+)
+from app.helpers.sendemail import sendemail
+from app.helpers.generate_qa_email_html import generate_qa_email_html
+from app.helpers.send_welcome_email import send_welcome_email
+
+
+# Raw Postmark webhook payloads waiting to be classified and handled
+inbound_email_queue = StreamQueue(
+    os.getenv("INBOUND_QUEUE_STREAM", "postmark_inbound"),
+    os.getenv("INBOUND_QUEUE_GROUP", "inbound_workers"),
+)
+
+# Postmark retries a webhook it thinks failed, remember MessageIDs we already queued
+INBOUND_DEDUPE_TTL_SECONDS = 24 * 60 * 60
+
+# Per stage concurrency limits inside one worker process,
+# replies are limited by the PostmarkClient connection pool
+PIPELINE_CLASSIFY_CONCURRENCY = int(os.getenv("PIPELINE_CLASSIFY_CONCURRENCY", "8"))
+PIPELINE_QA_CONCURRENCY = int(os.getenv("PIPELINE_QA_CONCURRENCY", "4"))
+
+_classify_semaphore = asyncio.Semaphore(PIPELINE_CLASSIFY_CONCURRENCY)
+_qa_semaphore = asyncio.Semaphore(PIPELINE_QA_CONCURRENCY)
+
+
+def validate_postmark_payload(json_data: Any) -> None:
+    """
+    Raises:
+        ValueError: If a field the pipeline needs is missing
+    """
+    if not isinstance(json_data, dict):
+        raise ValueError("Payload is not a JSON object")
+    if not json_data.get("From", None):
+        raise ValueError("Sender email not found")
+    if not json_data.get("Subject", None):
+        raise ValueError("Subject not found")
+    if (
+        not json_data.get("TextBody", None)
+        and not json_data.get("HtmlBody", None)
+        and not json_data.get("Attachments", None)
+    ):
+        raise ValueError("Text body not found")
+
+
+async def enqueue_inbound_email(json_data: dict[str, Any]) -> str | None:
+    """
+    Persist the raw webhook payload to the inbound stream.
+    Returns:
+        The stream message id, or None if this Postmark message was already queued
+    Raises:
+        Exception: If the payload could not be persisted, the webhook must fail so Postmark retries
+    """
+    message_id = json_data.get("MessageID", None)
+    dedupe_key = f"postmark:inbound:{message_id}" if message_id else None
+    redis_instance = await RedisConnection.connect()
+    if dedupe_key:
+        is_new = await redis_instance.set(
+            dedupe_key, "1", nx=True, ex=INBOUND_DEDUPE_TTL_SECONDS
+        )
+        if not is_new:
+            return None
+    try:
+        json_data = await strip_unused_attachments(json_data)
+        return await inbound_email_queue.enqueue({"payload": json.dumps(json_data)})
+    except Exception:
+        # Let Postmark's retry through, it would be dropped as a duplicate otherwise
+        if dedupe_key:
+            await redis_instance.delete(dedupe_key)
+        raise
+
+
+async def handle_new_user(json_data: dict[str, Any]) -> None:
+    sender_email: str = json_data["From"]
+    text_body: str = json_data.get("TextBody", None) or html_to_text(
+        json_data.get("HtmlBody", None) or ""
+    )
+    print(f"New user detected: {sender_email}")
+    text_body_without_links: str = await remove_links_async(text_body)
+    text_first_500_chars: str = text_body_without_links[:500]
+    async with _classify_semaphore:
+        extracted_name: OutputFormatExtractName = await extract_username_with_fast_path(
+            json_data.get("FromName", None), text_body, text_first_500_chars
+        )
+    username: str = extracted_name.username if extracted_name.username else sender_email
+    await create_user_service(sender_email, username)
+    await send_welcome_email(sender_email, username)
+
+
+async def process_inbound_email(json_data: dict[str, Any]) -> None:
+    """
+    Classify an inbound email and either save it for ingestion or answer the question by email.
+    Runs in the worker process, the webhook only queues the payload.
+    """
+    sender_email: str = json_data["From"]
+    email_subject: str = json_data["Subject"]
+    html_body = json_data.get("HtmlBody", None)
+    # Some clients only send HTML, forwarded documents may come without any body
+    text_body: str = json_data.get("TextBody", None) or html_to_text(html_body or "")
+
+    user_data = await get_user_by_email(sender_email)
+    if not user_data:
+        await handle_new_user(json_data)
+        return
+
+    user_id = user_data["id"]
+    text_body_without_links: str = await remove_links_async(text_body)
+    text_first_500_chars: str = text_body_without_links[:500]
+
+    async with _classify_semaphore:
+        classify_answer: OutputFormat = await classify_email_with_fast_path(
+            email_subject, text_body, text_first_500_chars
+        )
+
+    if classify_answer.action == "SAVE":
+        # Keyed on the MessageID, a retried job gets the email it saved before
+        email_ref_id = await create_email(
+            user_id,
+            email_subject,
+            text_body,
+            html_body,
+            is_forwarded=False,
+            postmark_message_id=json_data.get("MessageID", None),
+        )
+        redis_instance = await RedisConnection.connect()
+        queued_key = f"inbound:queued:{email_ref_id}"
+        if await redis_instance.exists(queued_key):
+            print(f"Jobs of email {email_ref_id} were already queued")
+            return
+        # Jobs replace what an earlier attempt wrote, queueing them twice is harmless
+        attachments_queued = await enqueue_document_attachments(
+            user_id, email_ref_id, str(email_subject), json_data
+        )
+        if attachments_queued:
+            print(f"Queued {attachments_queued} attachments of email {email_ref_id}")
+        # Postgres keeps the email as received, only the new content is embedded
+        normalized = await normalize_email_body(
+            str(user_id), json_data.get("TextBody", None), html_body
+        )
+        print(
+            f"Normalized email {email_ref_id} ({normalized.source} body): removed "
+            f"{normalized.chars_removed} chars, ~{normalized.chunks_removed} chunks, "
+            f"{normalized.history_blocks_removed} already saved history blocks"
+        )
+        if normalized.text:
+            text_to_embed: str = await remove_links_async(normalized.text)
+            await enqueue_email_processing_task(
+                user_id,
+                email_ref_id,
+                str(email_subject),
+                str(text_to_embed),
+                paragraph_fingerprints(normalized.text),
+            )
+            print("Email processing job queued for subject: ", email_subject)
+        else:
+            print("Nothing new to embed for subject: ", email_subject)
+        await redis_instance.set(queued_key, "1", ex=INBOUND_DEDUPE_TTL_SECONDS)
+        return
+
+    if classify_answer.action == "QA":
+        question: str = text_body
+        user_name: str = user_data["name"]
+        async with _qa_semaphore:
+            answer: str = await answer_question(question, str(user_id), user_name)
+        answer_html: str = generate_qa_email_html(question, answer)
+        truncated_question = question[:50] + ("..." if len(question) > 50 else "")
+        answer_email_subject: str = f"InboxMemory AI Answer: {truncated_question}"
+        await sendemail(sender_email, answer_email_subject, answer_html)
+        return
+
+    raise Exception(f"Unknown email action for subject: {email_subject}")
+
+
+async def process_inbound_job(fields: dict[str, str]) -> None:
+    await process_inbound_email(json.loads(fields["payload"]))
@@ -0,0 +1,185 @@
+import asyncio
+import math
+import os
+from typing import AsyncIterator
+import lancedb
+from lancedb.index import IvfPq, HnswPq, HnswSq, FTS, BTree
+from app.lance_db import LanceConnection, is_shared_table_name, request_table_optimize
+from app.gemini.get_embeddings import GEMINI_EMBEDDING_DIMENSIONS
+from app.background_jobs.leader import LeaderElection
+
+
+# Tables below this row count are small enough for a flat scan
+LANCE_INDEX_MIN_ROWS = int(os.getenv("LANCE_INDEX_MIN_ROWS", "5000"))
+# IVF_PQ, IVF_HNSW_PQ or IVF_HNSW_SQ
+LANCE_INDEX_TYPE = os.getenv("LANCE_INDEX_TYPE", "IVF_PQ")
+# Unindexed rows are merged into the index by table maintenance once there are this many
+LANCE_INDEX_MAX_UNINDEXED_ROWS = int(
+    os.getenv("LANCE_INDEX_MAX_UNINDEXED_ROWS", "1000")
+)
+# The index is rebuilt from scratch (new partitions) once the table has grown by this factor
+LANCE_INDEX_REBUILD_GROWTH = float(os.getenv("LANCE_INDEX_REBUILD_GROWTH", "4"))
+LANCE_INDEX_CHECK_SECONDS = int(os.getenv("LANCE_INDEX_CHECK_SECONDS", "300"))
+
+VECTOR_COLUMN = "vector"
+VECTOR_INDEX_NAME = f"{VECTOR_COLUMN}_idx"
+TEXT_COLUMN = "text"
+TEXT_INDEX_NAME = f"{TEXT_COLUMN}_idx"
+USER_ID_COLUMN = "user_id"
+
+
+def build_index_config(num_rows: int) -> IvfPq | HnswPq | HnswSq:
+    """
+    Index config sized for the table, roughly sqrt(rows) IVF partitions
+    and 16 dimensions per PQ sub vector.
+    """
+    num_partitions = max(1, int(math.sqrt(num_rows)))
+    num_sub_vectors = GEMINI_EMBEDDING_DIMENSIONS // 16
+    if LANCE_INDEX_TYPE == "IVF_HNSW_PQ":
+        return HnswPq(num_partitions=num_partitions, num_sub_vectors=num_sub_vectors)
+    if LANCE_INDEX_TYPE == "IVF_HNSW_SQ":
+        return HnswSq(num_partitions=num_partitions)
+    return IvfPq(num_partitions=num_partitions, num_sub_vectors=num_sub_vectors)
+
+
+async def iter_table_names(db: lancedb.AsyncConnection) -> AsyncIterator[str]:
+    page_token: str | None = None
+    while True:
+        response = await db.list_tables(page_token=page_token, limit=1000)
+        for name in response.tables:
+            yield name
+        page_token = response.page_token
+        if not page_token:
+            return
+
+
+async def ensure_fts_index(table_name: str) -> str:
+    """
+    Create the full text (BM25) index on the text column used by hybrid search.
+    Rows added later are picked up by optimize() during table maintenance.
+    Returns:
+        The action taken, for logging
+    """
+    table = await LanceConnection.get_table(table_name)
+    indices = await table.list_indices()
+    if any(index.name == TEXT_INDEX_NAME for index in indices):
+        return "up_to_date"
+    if await table.count_rows() == 0:
+        return "skipped"
+    await table.create_index(TEXT_COLUMN, config=FTS())
+    return "created"
+
+
+def get_scalar_index_columns(table_name: str) -> list[str]:
+    """
+    email_ref_id serves deletes, created_at date filters and user_id the per-user
+    prefilter of shared tables. Each value only covers a tiny slice of the rows,
+    BTree suits that better than Bitmap.
+    """
+    columns = ["email_ref_id", "created_at"]
+    if is_shared_table_name(table_name):
+        columns.insert(0, USER_ID_COLUMN)
+    return columns
+
+
+async def ensure_scalar_index(table_name: str, column: str) -> str:
+    """
+    Create the BTree index on a scalar column, or have table maintenance fold new rows into it.
+    Returns:
+        The action taken, for logging
+    """
+    table = await LanceConnection.get_table(table_name)
+    index_name = f"{column}_idx"
+    indices = await table.list_indices()
+    if any(index.name == index_name for index in indices):
+        stats = await table.index_stats(index_name)
+        if stats is not None and stats.num_unindexed_rows >= LANCE_INDEX_MAX_UNINDEXED_ROWS:
+            await request_table_optimize(table_name)
+            return "optimize_requested"
+        return "up_to_date"
+    if await table.count_rows() == 0:
+        return "skipped"
+    await table.create_index(column, config=BTree())
+    return "created"
+
+
+async def ensure_vector_index(table_name: str) -> str:
+    """
+    Create, optimize or rebuild the vector index of a table depending on its size.
+    Returns:
+        The action taken, for logging
+    """
+    table = await LanceConnection.get_table(table_name)
+    num_rows = await table.count_rows()
+    if num_rows < LANCE_INDEX_MIN_ROWS:
+        return "skipped"
+
+    indices = await table.list_indices()
+    has_index = any(index.name == VECTOR_INDEX_NAME for index in indices)
+    if not has_index:
+        await table.create_index(VECTOR_COLUMN, config=build_index_config(num_rows))
+        return "created"
+
+    stats = await table.index_stats(VECTOR_INDEX_NAME)
+    if stats is None:
+        return "skipped"
+
+    if num_rows >= stats.num_indexed_rows * LANCE_INDEX_REBUILD_GROWTH:
+        # Partitions were trained on a much smaller table, retrain them
+        await table.create_index(
+            VECTOR_COLUMN, config=build_index_config(num_rows), replace=True
+        )
+        return "rebuilt"
+
+    if stats.num_unindexed_rows >= LANCE_INDEX_MAX_UNINDEXED_ROWS:
+        # Table maintenance adds new rows to the existing index without retraining.
+        # It optimizes once per table however many indexes asked, and not while the
+        # table is being written.
+        await request_table_optimize(table_name)
+        return "optimize_requested"
+
+    return "up_to_date"
+
+
+class IndexManager:
+    """
+    Periodically checks every user table and keeps its ANN, full text and scalar indexes in shape.
+    Runs inside the worker process since that is where the writes happen,
+    only the replica holding the leader lock does the work.
+    """
+
+    def __init__(self, interval_seconds: int = LANCE_INDEX_CHECK_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.leader = LeaderElection("lance_index", interval_seconds * 2)
+
+    async def run_once(self) -> None:
+        db = await LanceConnection.connect()
+        async for table_name in iter_table_names(db):
+            for column in get_scalar_index_columns(table_name):
+                try:
+                    action = await ensure_scalar_index(table_name, column)
+                    if action not in ("skipped", "up_to_date"):
+                        print(f"{column} index {action} for table {table_name}")
+                except Exception as e:
+                    print(f"Error maintaining {column} index for table {table_name}: {e}")
+            try:
+                action = await ensure_vector_index(table_name)
+                if action not in ("skipped", "up_to_date"):
+                    print(f"Vector index {action} for table {table_name}")
+            except Exception as e:
+                print(f"Error maintaining vector index for table {table_name}: {e}")
+            try:
+                action = await ensure_fts_index(table_name)
+                if action not in ("skipped", "up_to_date"):
+                    print(f"Full text index {action} for table {table_name}")
+            except Exception as e:
+                print(f"Error maintaining full text index for table {table_name}: {e}")
+
+    async def run(self) -> None:
+        while True:
+            try:
+                if await self.leader.acquire():
+                    await self.run_once()
+            except Exception as e:
+                print(f"Error in index manager: {e}")
+            await asyncio.sleep(self.interval_seconds)
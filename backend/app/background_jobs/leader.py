@@ -0,0 +1,46 @@
+import uuid
+from app.database.redis_connect import RedisConnection
+
+
+# Only delete/extend the key if we still own it
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+_RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class LeaderElection:
+    """
+    Redis based leader election so a periodic job runs on only one replica.
+    The leader holds `leader:<name>` with a TTL and has to renew it before it expires.
+    """
+
+    def __init__(self, name: str, ttl_seconds: int):
+        self.key = f"leader:{name}"
+        self.ttl_ms = ttl_seconds * 1000
+        self.token = uuid.uuid4().hex
+
+    async def acquire(self) -> bool:
+        """
+        Become leader if nobody is, or stay leader if we already are.
+        """
+        redis_instance = await RedisConnection.connect()
+        if await redis_instance.set(self.key, self.token, nx=True, px=self.ttl_ms):
+            return True
+        renewed = await redis_instance.eval(
+            _RENEW_SCRIPT, 1, self.key, self.token, self.ttl_ms
+        )
+        return bool(renewed)
+
+    async def release(self) -> None:
+        redis_instance = await RedisConnection.connect()
+        await redis_instance.eval(_RELEASE_SCRIPT, 1, self.key, self.token)
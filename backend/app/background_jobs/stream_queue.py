@@ -0,0 +1,154 @@
+import json
+import os
+import time
+from typing import cast
+from app.database.redis_connect import RedisConnection
+
+
+# Defaults shared by every queue
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "5"))
+QUEUE_BACKOFF_BASE_SECONDS = float(os.getenv("QUEUE_BACKOFF_BASE_SECONDS", "2"))
+QUEUE_BACKOFF_MAX_SECONDS = float(os.getenv("QUEUE_BACKOFF_MAX_SECONDS", "300"))
+# Dead-letter streams are trimmed to roughly this many entries, oldest first
+QUEUE_DEAD_LETTER_MAXLEN = int(os.getenv("QUEUE_DEAD_LETTER_MAXLEN", "1000"))
+
+
+class StreamQueue:
+    """
+    Durable job queue on a Redis Stream with a consumer group.
+    The API tier only enqueues jobs, the worker process (app.background_jobs.worker) drains them.
+    Failed jobs wait in a sorted set for their backoff and end up in `<stream>:dead`
+    after max_attempts. Acked jobs are deleted from the stream, payloads can be large.
+    """
+
+    def __init__(
+        self,
+        stream: str,
+        group: str,
+        max_attempts: int = QUEUE_MAX_ATTEMPTS,
+        dead_letter_maxlen: int = QUEUE_DEAD_LETTER_MAXLEN,
+    ):
+        self.stream = stream
+        self.group = group
+        self.dead_letter_stream = f"{stream}:dead"
+        self.delayed_key = f"{stream}:delayed"
+        self.max_attempts = max_attempts
+        self.dead_letter_maxlen = dead_letter_maxlen
+
+    async def ensure_consumer_group(self) -> None:
+        """
+        Create the stream and consumer group if they do not exist yet.
+        """
+        redis_instance = await RedisConnection.connect()
+        try:
+            await redis_instance.xgroup_create(
+                self.stream, self.group, id="0", mkstream=True
+            )
+        except Exception as e:
+            # BUSYGROUP means the group already exists
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def enqueue(self, fields: dict[str, str]) -> str:
+        """
+        Push a job to the stream.
+        Returns:
+            The stream message id
+        """
+        redis_instance = await RedisConnection.connect()
+        message_id = await redis_instance.xadd(self.stream, {**fields, "attempts": "0"})
+        return cast(str, message_id)
+
+    async def ack(self, message_id: str) -> None:
+        """
+        Remove a finished job from the pending list and from the stream.
+        """
+        redis_instance = await RedisConnection.connect()
+        async with redis_instance.pipeline(transaction=True) as pipe:
+            pipe.xack(self.stream, self.group, message_id)
+            pipe.xdel(self.stream, message_id)
+            await pipe.execute()
+
+    async def delivery_count(self, message_id: str) -> int:
+        """
+        How often a pending job was handed to a consumer, including claims after a crash.
+        """
+        redis_instance = await RedisConnection.connect()
+        pending = await redis_instance.xpending_range(
+            self.stream, self.group, min=message_id, max=message_id, count=1
+        )
+        return int(pending[0]["times_delivered"]) if pending else 0
+
+    async def keep_claimed(self, message_id: str, consumer_name: str) -> None:
+        """
+        Reset the idle time of a job that is still running so no other consumer claims it.
+        JUSTID leaves the delivery count alone.
+        """
+        redis_instance = await RedisConnection.connect()
+        await redis_instance.xclaim(
+            self.stream,
+            self.group,
+            consumer_name,
+            min_idle_time=0,
+            message_ids=[message_id],
+            justid=True,
+        )
+
+    async def dead_letter(self, fields: dict[str, str], error: str) -> None:
+        redis_instance = await RedisConnection.connect()
+        await redis_instance.xadd(
+            self.dead_letter_stream,
+            {**fields, "last_error": error[:500]},
+            maxlen=self.dead_letter_maxlen,
+            approximate=True,
+        )
+
+    @staticmethod
+    def get_retry_delay(attempts: int) -> float:
+        """
+        Exponential backoff delay in seconds for the given attempt count
+        """
+        delay = QUEUE_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+        return min(delay, QUEUE_BACKOFF_MAX_SECONDS)
+
+    async def schedule_retry_or_dead_letter(
+        self, fields: dict[str, str], error: str
+    ) -> bool:
+        """
+        Schedule a failed job for a delayed retry, or move it to the dead-letter stream
+        once it has used up max_attempts.
+        Returns:
+            True if a retry was scheduled, False if the job was dead-lettered
+        """
+        redis_instance = await RedisConnection.connect()
+        attempts = int(fields.get("attempts", "0")) + 1
+        retry_fields = {**fields, "attempts": str(attempts), "last_error": error[:500]}
+
+        if attempts >= self.max_attempts:
+            await self.dead_letter(retry_fields, error)
+            return False
+
+        run_at = time.time() + self.get_retry_delay(attempts)
+        await redis_instance.zadd(self.delayed_key, {json.dumps(retry_fields): run_at})
+        return True
+
+    async def requeue_due_retries(self, limit: int = 100) -> int:
+        """
+        Move delayed retries whose backoff has elapsed back to the stream.
+        Safe to run from many workers, ZREM decides which one owns each entry.
+        Returns:
+            Number of jobs requeued
+        """
+        redis_instance = await RedisConnection.connect()
+        due = cast(
+            list[str],
+            await redis_instance.zrangebyscore(
+                self.delayed_key, "-inf", time.time(), start=0, num=limit
+            ),
+        )
+        requeued = 0
+        for member in due:
+            if await redis_instance.zrem(self.delayed_key, member):
+                await redis_instance.xadd(self.stream, json.loads(member))
+                requeued += 1
+        return requeued
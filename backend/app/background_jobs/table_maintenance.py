@@ -0,0 +1,163 @@
+import asyncio
+import json
+import os
+import time
+from datetime import timedelta
+from typing import Any, cast
+from app.database.redis_connect import RedisConnection
+from app.lance_db import (
+    LANCE_OPTIMIZE_REQUESTS_KEY,
+    LanceConnection,
+    is_table_recently_written,
+)
+from app.background_jobs.index_manager import iter_table_names
+from app.background_jobs.leader import LeaderElection
+
+
+LANCE_MAINTENANCE_INTERVAL_SECONDS = int(
+    os.getenv("LANCE_MAINTENANCE_INTERVAL_SECONDS", "3600")
+)
+# How often tables the index manager asked to optimize are handled between full runs
+LANCE_OPTIMIZE_REQUEST_CHECK_SECONDS = int(
+    os.getenv("LANCE_OPTIMIZE_REQUEST_CHECK_SECONDS", "300")
+)
+# Versions older than this are removed from lance_storage
+LANCE_VERSION_RETENTION_HOURS = int(os.getenv("LANCE_VERSION_RETENTION_HOURS", "24"))
+# Tables with fewer fragments than this are left alone
+LANCE_MAINTENANCE_MIN_FRAGMENTS = int(
+    os.getenv("LANCE_MAINTENANCE_MIN_FRAGMENTS", "8")
+)
+# A table that is never quiet for LANCE_WRITE_QUIET_SECONDS (the shared tables get writes from
+# every user) is maintained anyway once it has been skipped for this long
+LANCE_MAINTENANCE_MAX_DEFERRAL_SECONDS = int(
+    os.getenv("LANCE_MAINTENANCE_MAX_DEFERRAL_SECONDS", "21600")
+)
+# Pause between tables so maintenance doesn't hog disk IO
+LANCE_MAINTENANCE_TABLE_PAUSE_SECONDS = float(
+    os.getenv("LANCE_MAINTENANCE_TABLE_PAUSE_SECONDS", "0.5")
+)
+
+
+async def get_table_stats(table_name: str) -> dict[str, Any]:
+    table = await LanceConnection.get_table(table_name)
+    # Annotated as the TableStatistics class, at runtime it is a plain dict
+    stats = cast(dict[str, Any], await table.stats())
+    versions = await table.list_versions()
+    return {
+        "num_rows": stats["num_rows"],
+        "total_bytes": stats["total_bytes"],
+        "num_fragments": stats["fragment_stats"]["num_fragments"],
+        "num_small_fragments": stats["fragment_stats"]["num_small_fragments"],
+        "num_versions": len(versions),
+    }
+
+
+async def maintain_table(table_name: str, requested: bool = False) -> dict[str, Any] | None:
+    """
+    Compact fragments, materialize deleted rows, fold new rows into the indexes and prune
+    old versions of one table. The only place tables are optimized.
+    Args:
+        requested: The index manager asked for it, optimize even if there is little to compact
+    Returns:
+        before/after stats, or None if the table was skipped
+    """
+    redis_instance = await RedisConnection.connect()
+    deferred_key = f"lance:maintenance_deferred:{table_name}"
+    if await is_table_recently_written(table_name):
+        await redis_instance.set(deferred_key, int(time.time()), nx=True)
+        deferred_since = cast(str, await redis_instance.get(deferred_key))
+        if time.time() - int(deferred_since) < LANCE_MAINTENANCE_MAX_DEFERRAL_SECONDS:
+            return None
+        print(
+            f"Table {table_name} skipped for over {LANCE_MAINTENANCE_MAX_DEFERRAL_SECONDS}s "
+            "of writes, maintaining it anyway"
+        )
+
+    await redis_instance.delete(deferred_key)
+    before = await get_table_stats(table_name)
+    if (
+        not requested
+        and before["num_fragments"] < LANCE_MAINTENANCE_MIN_FRAGMENTS
+        and before["num_versions"] <= 1
+    ):
+        return None
+
+    table = await LanceConnection.get_table(table_name)
+    # Compaction also rewrites fragments with deleted rows, which reclaims their space
+    await table.optimize(
+        cleanup_older_than=timedelta(hours=LANCE_VERSION_RETENTION_HOURS)
+    )
+    await redis_instance.srem(LANCE_OPTIMIZE_REQUESTS_KEY, table_name)
+    after = await get_table_stats(table_name)
+    return {"before": before, "after": after}
+
+
+class TableMaintenanceScheduler:
+    """
+    Periodically compacts and cleans up every user table.
+    Only the replica holding the leader lock does the work.
+    """
+
+    def __init__(self, interval_seconds: int = LANCE_MAINTENANCE_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        # Leader lock outlives one interval so a slow run doesn't hand over mid-way
+        self.leader = LeaderElection("lance_maintenance", interval_seconds * 2)
+
+    async def _maintain(self, table_name: str, requested: set[str]) -> None:
+        try:
+            result = await maintain_table(table_name, requested=table_name in requested)
+            if result is None:
+                return
+            print(
+                f"Maintained table {table_name}: "
+                f"before={result['before']} after={result['after']}"
+            )
+            redis_instance = await RedisConnection.connect()
+            await redis_instance.hset(
+                f"lance:maintenance:{table_name}", mapping={
+                    "before": json.dumps(result["before"]),
+                    "after": json.dumps(result["after"]),
+                }
+            )
+        except Exception as e:
+            print(f"Error maintaining table {table_name}: {e}")
+        await asyncio.sleep(LANCE_MAINTENANCE_TABLE_PAUSE_SECONDS)
+
+    async def _optimize_requests(self) -> set[str]:
+        redis_instance = await RedisConnection.connect()
+        return cast(set[str], await redis_instance.smembers(LANCE_OPTIMIZE_REQUESTS_KEY))
+
+    async def run_once(self) -> None:
+        db = await LanceConnection.connect()
+        requested = await self._optimize_requests()
+        async for table_name in iter_table_names(db):
+            if not await self.leader.acquire():
+                print("Lost lance maintenance leadership, stopping run")
+                return
+            await self._maintain(table_name, requested)
+
+    async def run_requested(self) -> None:
+        """
+        Only the tables the index manager asked to optimize, between full runs
+        """
+        requested = await self._optimize_requests()
+        for table_name in sorted(requested):
+            if not await self.leader.acquire():
+                print("Lost lance maintenance leadership, stopping run")
+                return
+            await self._maintain(table_name, requested)
+
+    async def run(self) -> None:
+        last_full_run: float | None = None
+        while True:
+            try:
+                if await self.leader.acquire():
+                    now = time.monotonic()
+                    if last_full_run is None or now - last_full_run >= self.interval_seconds:
+                        last_full_run = now
+                        await self.run_once()
+                    else:
+                        await self.run_requested()
+            except Exception as e:
+                print(f"Error in lance maintenance: {e}")
+            await asyncio.sleep(min(self.interval_seconds, LANCE_OPTIMIZE_REQUEST_CHECK_SECONDS))
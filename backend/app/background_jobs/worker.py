@@ -0,0 +1,252 @@
+import asyncio
+import os
+import signal
+import socket
+import uuid
+from typing import Awaitable, Callable, Optional, cast
+from app.database.database import Database
+from app.database.redis_connect import RedisConnection
+from app.gemini.client import GeminiClient
+from app.lance_db import LanceConnection
+from app.helpers.metrics import run_metrics_flusher
+from app.helpers.postmark_client import PostmarkClient
+from app.helpers.text_preparation import TextPreparationPool
+from app.service.email.attachments import AttachmentPool
+from app.background_jobs.email_processor import (
+    process_attachment_background,
+    process_email_background,
+)
+from app.background_jobs.index_manager import IndexManager
+from app.background_jobs.table_maintenance import TableMaintenanceScheduler
+from app.background_jobs.stream_queue import StreamQueue
+from app.background_jobs.email_queue import (
+    attachment_processing_queue,
+    email_processing_queue,
+)
+from app.background_jobs.inbound_pipeline import (
+    inbound_email_queue,
+    process_inbound_job,
+)
+
+
+# Number of emails processed concurrently by one worker process
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4"))
+# Number of attachments extracted and embedded concurrently by one worker process,
+# extraction itself is limited by the ATTACHMENT_PROCESSES pool
+ATTACHMENT_WORKER_CONCURRENCY = int(os.getenv("ATTACHMENT_WORKER_CONCURRENCY", "2"))
+# Number of inbound webhooks (classify, QA, reply) handled concurrently by one worker process
+INBOUND_WORKER_CONCURRENCY = int(os.getenv("INBOUND_WORKER_CONCURRENCY", "8"))
+# Messages left un-acked by a crashed worker for this long are claimed by another one
+WORKER_CLAIM_IDLE_MS = int(os.getenv("WORKER_CLAIM_IDLE_MS", "300000"))
+# Running jobs renew their claim this often so long jobs aren't claimed while still running
+WORKER_HEARTBEAT_SECONDS = WORKER_CLAIM_IDLE_MS / 1000 / 3
+# Must stay below the Redis socket_timeout (5s), or an idle XREADGROUP times out the connection
+WORKER_BLOCK_MS = 2000
+
+
+async def process_email_job(fields: dict[str, str]) -> None:
+    await process_email_background(
+        fields["user_id"],
+        fields["email_ref_id"],
+        fields["email_subject"],
+        fields["text_body"],
+        [
+            fingerprint
+            for fingerprint in fields.get("paragraph_fingerprints", "").split(",")
+            if fingerprint
+        ],
+    )
+
+
+async def process_attachment_job(fields: dict[str, str]) -> None:
+    await process_attachment_background(
+        fields["user_id"],
+        fields["email_ref_id"],
+        fields["email_subject"],
+        fields["attachment_name"],
+        fields["filetype"],
+        fields["content"],
+    )
+
+
+class StreamWorker:
+    """
+    Drains a StreamQueue with a bounded number of concurrent jobs.
+    Start more processes to scale throughput:
+        python -m app.background_jobs.worker
+    """
+
+    def __init__(
+        self,
+        queue: StreamQueue,
+        handler: Callable[[dict[str, str]], Awaitable[None]],
+        concurrency: int,
+        stopping: asyncio.Event,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.consumer_name = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: set[asyncio.Task] = set()
+        self._stopping = stopping
+
+    async def _heartbeat(self, message_id: str) -> None:
+        while True:
+            await asyncio.sleep(WORKER_HEARTBEAT_SECONDS)
+            try:
+                await self.queue.keep_claimed(message_id, self.consumer_name)
+            except Exception as e:
+                print(f"Error renewing claim on job {message_id}: {e}")
+
+    async def _handle(self, message_id: str, fields: dict[str, str]) -> None:
+        heartbeat = asyncio.create_task(self._heartbeat(message_id))
+        try:
+            try:
+                await self.handler(fields)
+            except Exception as e:
+                print(f"Job {message_id} on {self.queue.stream} failed: {e}")
+                retried = await self.queue.schedule_retry_or_dead_letter(fields, str(e))
+                if not retried:
+                    print(f"Job {message_id} moved to {self.queue.dead_letter_stream}")
+            # The job is either done or re-scheduled, so it leaves the pending list.
+            # If re-scheduling failed it stays pending and is claimed again after
+            # WORKER_CLAIM_IDLE_MS.
+            await self.queue.ack(message_id)
+        except Exception as e:
+            print(f"Job {message_id} on {self.queue.stream} left pending: {e}")
+        finally:
+            heartbeat.cancel()
+            self._semaphore.release()
+
+    def _spawn(self, message_id: str, fields: dict[str, str]) -> None:
+        task = asyncio.create_task(self._handle(message_id, fields))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _claim_stale(self) -> list[tuple[str, dict[str, str]]]:
+        redis_instance = await RedisConnection.connect()
+        free_slots = self.concurrency - len(self._tasks)
+        if free_slots <= 0:
+            return []
+        result = await redis_instance.xautoclaim(
+            self.queue.stream,
+            self.queue.group,
+            self.consumer_name,
+            min_idle_time=WORKER_CLAIM_IDLE_MS,
+            start_id="0-0",
+            count=free_slots,
+        )
+        messages: list[tuple[str, dict[str, str]]] = []
+        for message_id, fields in result[1]:
+            if not fields:
+                continue
+            # A job that keeps killing its worker never reaches schedule_retry_or_dead_letter
+            if await self.queue.delivery_count(message_id) > self.queue.max_attempts:
+                print(f"Job {message_id} crashed its worker too often, moving it to dead letter")
+                await self.queue.dead_letter(fields, "Worker died while running the job")
+                await self.queue.ack(message_id)
+                continue
+            messages.append((message_id, fields))
+        return messages
+
+    async def _read_new(self) -> list[tuple[str, dict[str, str]]]:
+        redis_instance = await RedisConnection.connect()
+        free_slots = self.concurrency - len(self._tasks)
+        if free_slots <= 0:
+            return []
+        response = cast(
+            Optional[list[tuple[str, list[tuple[str, dict[str, str]]]]]],
+            await redis_instance.xreadgroup(
+                self.queue.group,
+                self.consumer_name,
+                {self.queue.stream: ">"},
+                count=free_slots,
+                block=WORKER_BLOCK_MS,
+            ),
+        )
+        messages: list[tuple[str, dict[str, str]]] = []
+        for _stream, stream_messages in response or []:
+            messages.extend(stream_messages)
+        return messages
+
+    async def run(self) -> None:
+        await self.queue.ensure_consumer_group()
+        print(
+            f"Worker {self.consumer_name} on {self.queue.stream} started "
+            f"with concurrency {self.concurrency}"
+        )
+        while not self._stopping.is_set():
+            try:
+                await self.queue.requeue_due_retries()
+                messages = await self._claim_stale()
+                if not messages:
+                    messages = await self._read_new()
+                for message_id, fields in messages:
+                    await self._semaphore.acquire()
+                    self._spawn(message_id, fields)
+                if not messages and len(self._tasks) >= self.concurrency:
+                    # Every slot is busy, wait for one to free up
+                    await asyncio.wait(
+                        self._tasks, return_when=asyncio.FIRST_COMPLETED
+                    )
+            except Exception as e:
+                print(f"Error in worker loop for {self.queue.stream}: {e}")
+                await asyncio.sleep(1)
+
+        if self._tasks:
+            print(f"Waiting for {len(self._tasks)} running jobs to finish")
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def main() -> None:
+    await Database.connect()
+    await RedisConnection.connect()
+    GeminiClient.connect()
+    await LanceConnection.connect()
+    await PostmarkClient.start()
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    workers = [
+        StreamWorker(
+            email_processing_queue, process_email_job, WORKER_CONCURRENCY, stopping
+        ),
+        StreamWorker(
+            attachment_processing_queue,
+            process_attachment_job,
+            ATTACHMENT_WORKER_CONCURRENCY,
+            stopping,
+        ),
+        StreamWorker(
+            inbound_email_queue,
+            process_inbound_job,
+            INBOUND_WORKER_CONCURRENCY,
+            stopping,
+        ),
+    ]
+    index_task = asyncio.create_task(IndexManager().run())
+    maintenance_task = asyncio.create_task(TableMaintenanceScheduler().run())
+    metrics_task = asyncio.create_task(run_metrics_flusher())
+    try:
+        await asyncio.gather(*(worker.run() for worker in workers))
+    finally:
+        index_task.cancel()
+        maintenance_task.cancel()
+        # Flushes what is still buffered before Redis is disconnected
+        metrics_task.cancel()
+        await asyncio.gather(metrics_task, return_exceptions=True)
+        await PostmarkClient.stop()
+        TextPreparationPool.shutdown()
+        AttachmentPool.shutdown()
+        await Database.disconnect()
+        await RedisConnection.disconnect()
+        await GeminiClient.disconnect()
+        await LanceConnection.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,8 +2,10 @@ from typing import Optional, List, Any, AsyncGenerator
 import asyncpg
 import os
 from contextlib import asynccontextmanager
+from app.helpers.metrics import incr_local_metric
 
 DATABASE_URL: str = os.getenv("DATABASE_URL", "")
+DATABASE_METRIC = "database"
 
 
 class Database:
@@ -30,43 +32,41 @@ class Database:
                 raise RuntimeError(f"Failed to disconnect from database: {e}")
 
     @classmethod
-    async def fetch(cls, query: str, *args: Any) -> List[asyncpg.Record]:
-        """Fetch multiple rows"""
+    def _acquire(cls) -> asyncpg.pool.PoolAcquireContext:
+        """Acquire a pool connection, acquisitions are counted in the process metrics"""
         if not cls._pool:
             raise RuntimeError("Database connection not established")
-        async with cls._pool.acquire() as connection:
+        incr_local_metric(DATABASE_METRIC, "pool_acquisitions")
+        return cls._pool.acquire()
+
+    @classmethod
+    async def fetch(cls, query: str, *args: Any) -> List[asyncpg.Record]:
+        """Fetch multiple rows"""
+        async with cls._acquire() as connection:
             return await connection.fetch(query, *args)
 
     @classmethod
     async def fetchrow(cls, query: str, *args: Any) -> Optional[asyncpg.Record]:
         """Fetch a single row"""
-        if not cls._pool:
-            raise RuntimeError("Database connection not established")
-        async with cls._pool.acquire() as connection:
+        async with cls._acquire() as connection:
             return await connection.fetchrow(query, *args)
 
     @classmethod
     async def fetchval(cls, query: str, *args: Any) -> Any:
         """Fetch a single value"""
-        if not cls._pool:
-            raise RuntimeError("Database connection not established")
-        async with cls._pool.acquire() as connection:
+        async with cls._acquire() as connection:
             return await connection.fetchval(query, *args)
 
     @classmethod
     async def execute(cls, query: str, *args: Any) -> str:
         """Execute query without returning results"""
-        if not cls._pool:
-            raise RuntimeError("Database connection not established")
-        async with cls._pool.acquire() as connection:
+        async with cls._acquire() as connection:
             return await connection.execute(query, *args)
 
     @classmethod
     async def executemany(cls, query: str, args: List[tuple]) -> None:
         """Execute query with multiple sets of arguments"""
-        if not cls._pool:
-            raise RuntimeError("Database connection not established")
-        async with cls._pool.acquire() as connection:
+        async with cls._acquire() as connection:
             await connection.executemany(query, args)
 
     @classmethod
@@ -74,18 +74,13 @@ class Database:
         cls, query: str, *args: Any
     ) -> Optional[asyncpg.Record]:
         """Execute query and return the affected row(s)"""
-        if not cls._pool:
-            raise RuntimeError("Database connection not established")
-        async with cls._pool.acquire() as connection:
+        async with cls._acquire() as connection:
             return await connection.fetchrow(query, *args)
 
     @classmethod
     @asynccontextmanager
     async def transaction(cls) -> AsyncGenerator[asyncpg.Connection, None]:
         """Context manager for database transactions"""
-        if not cls._pool:
-            raise RuntimeError("Database connection not established")
-
-        async with cls._pool.acquire() as connection:
+        async with cls._acquire() as connection:
             async with connection.transaction():
                 yield connection
@@ -7,6 +7,7 @@ from typing import Optional
 
 class RedisConnection:
     _instance: Optional[redis.Redis] = None
+    _binary_instance: Optional[redis.Redis] = None
 
     @classmethod
     async def connect(cls) -> redis.Redis:
@@ -33,9 +34,30 @@ class RedisConnection:
 
         return cls._instance
 
+    @classmethod
+    async def connect_binary(cls) -> redis.Redis:
+        """
+        Connection that returns raw bytes instead of decoded strings.
+        Used for packed binary values such as embedding vectors.
+        """
+        if cls._binary_instance is None:
+            redis_url = os.getenv("REDIS_URL", "redis://redis:6379")
+            cls._binary_instance = redis.from_url(
+                redis_url,
+                decode_responses=False,
+                socket_connect_timeout=5,
+                socket_timeout=5,
+                retry_on_timeout=True,
+                health_check_interval=30,
+            )
+        return cls._binary_instance
+
     @classmethod
     async def disconnect(cls):
         """Disconnect from Redis."""
+        if cls._binary_instance:
+            await cls._binary_instance.close()
+            cls._binary_instance = None
         if cls._instance:
             await cls._instance.close()
             cls._instance = None
@@ -0,0 +1,225 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+import httpx
+from google import genai
+from google.genai import types
+
+
+T = TypeVar("T")
+
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "20"))
+GEMINI_EMBED_CONCURRENCY = int(os.getenv("GEMINI_EMBED_CONCURRENCY", "8"))
+GEMINI_GENERATE_CONCURRENCY = int(os.getenv("GEMINI_GENERATE_CONCURRENCY", "8"))
+# Requests per second allowed by the token bucket, burst is the bucket size
+GEMINI_EMBED_RPS = float(os.getenv("GEMINI_EMBED_RPS", "20"))
+GEMINI_GENERATE_RPS = float(os.getenv("GEMINI_GENERATE_RPS", "10"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_BACKOFF_BASE_SECONDS = 1.0
+GEMINI_BACKOFF_MAX_SECONDS = 30.0
+
+
+class TokenBucket:
+    """
+    Simple async token bucket. Each acquire takes one token,
+    tokens refill at `rate` per second up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limiter with AIMD behaviour.
+    The limit grows by one after a full window of successes and is halved on rate limit errors.
+    """
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max_limit
+        self.limit: float = max_limit
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            while self._in_flight >= int(self.limit):
+                await self._condition.wait()
+            self._in_flight += 1
+
+    async def release(self) -> None:
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self) -> None:
+        # Additive increase: +1 per `limit` successful calls
+        self.limit = min(self.max_limit, self.limit + 1 / max(self.limit, 1))
+
+    def on_rate_limited(self) -> None:
+        # Multiplicative decrease
+        self.limit = max(1.0, self.limit / 2)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    True if the error is a 429 / RESOURCE_EXHAUSTED response from Gemini
+    """
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code == 429 or "RESOURCE_EXHAUSTED" in str(error)
+
+
+class GeminiClient:
+    """
+    Process wide Gemini client.
+    Keeps one genai.Client (and its http connection pool) for the lifetime of the process
+    and limits concurrent embedding and generation calls separately.
+    """
+
+    _client: Optional[genai.Client] = None
+    embed_limiter = AdaptiveLimiter(GEMINI_EMBED_CONCURRENCY)
+    generate_limiter = AdaptiveLimiter(GEMINI_GENERATE_CONCURRENCY)
+    embed_bucket = TokenBucket(GEMINI_EMBED_RPS)
+    generate_bucket = TokenBucket(GEMINI_GENERATE_RPS)
+
+    @classmethod
+    def connect(cls) -> genai.Client:
+        """Create the shared client if needed and return it."""
+        if cls._client is None:
+            API_KEY: str = os.getenv("GEMINI_API_KEY", "")
+            http_options = types.HttpOptions(
+                async_client_args={
+                    "limits": httpx.Limits(
+                        max_connections=GEMINI_MAX_CONNECTIONS,
+                        max_keepalive_connections=GEMINI_MAX_CONNECTIONS,
+                        keepalive_expiry=60,
+                    )
+                }
+            )
+            cls._client = genai.Client(api_key=API_KEY, http_options=http_options)
+            print("✅ Gemini client created")
+        return cls._client
+
+    @classmethod
+    async def disconnect(cls) -> None:
+        """Close the shared client and its connections."""
+        if cls._client:
+            aclose = getattr(cls._client.aio, "aclose", None)
+            if aclose:
+                await aclose()
+            cls._client = None
+            print("Gemini client closed")
+
+    @classmethod
+    async def _call(
+        cls,
+        limiter: AdaptiveLimiter,
+        bucket: TokenBucket,
+        fn: Callable[[genai.Client], Awaitable[T]],
+    ) -> T:
+        client = cls.connect()
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            await limiter.acquire()
+            try:
+                result = await fn(client)
+                limiter.on_success()
+                return result
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= GEMINI_MAX_RETRIES:
+                    raise
+                limiter.on_rate_limited()
+                error = e
+            finally:
+                await limiter.release()
+
+            # Back off outside of the limiter so other calls are not blocked by this sleep
+            attempt += 1
+            await cls._backoff(limiter, attempt, error)
+
+    @staticmethod
+    async def _backoff(limiter: AdaptiveLimiter, attempt: int, error: Exception) -> None:
+        delay = min(
+            GEMINI_BACKOFF_MAX_SECONDS,
+            GEMINI_BACKOFF_BASE_SECONDS * (2 ** (attempt - 1)),
+        )
+        delay = random.uniform(delay / 2, delay)
+        print(
+            f"Gemini rate limited ({error}), retry {attempt} in {delay:.1f}s, "
+            f"limit now {int(limiter.limit)}"
+        )
+        await asyncio.sleep(delay)
+
+    @classmethod
+    async def embed_content(cls, **kwargs: Any) -> types.EmbedContentResponse:
+        return await cls._call(
+            cls.embed_limiter,
+            cls.embed_bucket,
+            lambda client: client.aio.models.embed_content(**kwargs),
+        )
+
+    @classmethod
+    async def generate_content(cls, **kwargs: Any) -> types.GenerateContentResponse:
+        return await cls._call(
+            cls.generate_limiter,
+            cls.generate_bucket,
+            lambda client: client.aio.models.generate_content(**kwargs),
+        )
+
+    @classmethod
+    async def generate_content_stream(
+        cls, **kwargs: Any
+    ) -> AsyncIterator[types.GenerateContentResponse]:
+        """
+        Stream generated chunks. The limiter slot is held until the stream is drained or closed.
+        Rate limit errors feed the limiter wherever they happen, the call is only retried
+        if no chunk was yielded yet.
+        """
+        client = cls.connect()
+        limiter = cls.generate_limiter
+        attempt = 0
+        while True:
+            await cls.generate_bucket.acquire()
+            await limiter.acquire()
+            yielded = False
+            try:
+                stream = await client.aio.models.generate_content_stream(**kwargs)
+                async for chunk in stream:
+                    yielded = True
+                    yield chunk
+                limiter.on_success()
+                return
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                limiter.on_rate_limited()
+                if yielded or attempt >= GEMINI_MAX_RETRIES:
+                    raise
+                error = e
+            finally:
+                await limiter.release()
+
+            attempt += 1
+            await cls._backoff(limiter, attempt, error)
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import re
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Optional, cast
+from app.database.redis_connect import RedisConnection
+from app.helpers.metrics import incr_buffered_metric
+
+
+EMBEDDING_CACHE_LRU_SIZE = int(os.getenv("EMBEDDING_CACHE_LRU_SIZE", "5000"))
+EMBEDDING_CACHE_TTL_SECONDS = int(
+    os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(30 * 24 * 60 * 60))
+)
+# Questions are cached for a short time only, dashboard users re-ask within a session
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = int(
+    os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", str(60 * 60))
+)
+EMBEDDING_CACHE_METRIC = "embedding_cache"
+
+_whitespace_pattern = re.compile(r"\s+")
+_trailing_punctuation_pattern = re.compile(r"[\s?!.]+$")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text so trivially different copies (unicode forms, whitespace) share a cache key
+    """
+    text = unicodedata.normalize("NFKC", text)
+    return _whitespace_pattern.sub(" ", text).strip()
+
+
+def normalize_question(question: str) -> str:
+    """
+    Questions that differ only in case, spacing or trailing punctuation share one embedding
+    """
+    return _trailing_punctuation_pattern.sub("", normalize_text(question).lower())
+
+
+def embedding_cache_key(
+    text: str, model: str, task_type: str, title: Optional[str] = None
+) -> str:
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8"))
+    if title:
+        digest.update(b"\x00" + normalize_text(title).encode("utf-8"))
+    return f"emb:{model}:{task_type}:{digest.hexdigest()}"
+
+
+def pack_vector(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(data: bytes) -> list[float]:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """
+    Two tier embedding cache.
+    A bounded in-process LRU in front of Redis, vectors are stored in Redis as packed float32 bytes.
+    """
+
+    _lru: OrderedDict[str, list[float]] = OrderedDict()
+
+    @classmethod
+    def _lru_get(cls, key: str) -> Optional[list[float]]:
+        vector = cls._lru.get(key)
+        if vector is not None:
+            cls._lru.move_to_end(key)
+        return vector
+
+    @classmethod
+    def _lru_set(cls, key: str, vector: list[float]) -> None:
+        cls._lru[key] = vector
+        cls._lru.move_to_end(key)
+        while len(cls._lru) > EMBEDDING_CACHE_LRU_SIZE:
+            cls._lru.popitem(last=False)
+
+    @classmethod
+    async def get_many(cls, keys: list[str]) -> list[Optional[list[float]]]:
+        """
+        Look up many keys, returns None for every miss.
+        """
+        results: list[Optional[list[float]]] = [cls._lru_get(key) for key in keys]
+        lru_hits = sum(1 for vector in results if vector is not None)
+
+        missing = [index for index, vector in enumerate(results) if vector is None]
+        redis_hits = 0
+        if missing:
+            try:
+                redis_instance = await RedisConnection.connect_binary()
+                values = cast(
+                    list[Optional[bytes]],
+                    await redis_instance.mget([keys[index] for index in missing]),
+                )
+                for index, value in zip(missing, values):
+                    if value:
+                        vector = unpack_vector(value)
+                        results[index] = vector
+                        cls._lru_set(keys[index], vector)
+                        redis_hits += 1
+            except Exception as e:
+                print(f"Error reading embedding cache: {e}")
+
+        misses = len(keys) - lru_hits - redis_hits
+        if lru_hits:
+            incr_buffered_metric(EMBEDDING_CACHE_METRIC, "lru_hits", lru_hits)
+        if redis_hits:
+            incr_buffered_metric(EMBEDDING_CACHE_METRIC, "redis_hits", redis_hits)
+        if misses:
+            incr_buffered_metric(EMBEDDING_CACHE_METRIC, "misses", misses)
+        return results
+
+    @classmethod
+    async def set_many(
+        cls,
+        items: dict[str, list[float]],
+        ttl_seconds: int = EMBEDDING_CACHE_TTL_SECONDS,
+    ) -> None:
+        for key, vector in items.items():
+            cls._lru_set(key, vector)
+        try:
+            redis_instance = await RedisConnection.connect_binary()
+            async with redis_instance.pipeline(transaction=False) as pipe:
+                for key, vector in items.items():
+                    pipe.setex(key, ttl_seconds, pack_vector(vector))
+                await pipe.execute()
+        except Exception as e:
+            print(f"Error writing embedding cache: {e}")
+
+    @classmethod
+    def record_miss_latency(cls, elapsed_ms: float, texts: int) -> None:
+        """
+        Track how long the Gemini calls for cache misses took,
+        saved latency is roughly hits * (miss_latency_ms / miss_texts).
+        """
+        incr_buffered_metric(EMBEDDING_CACHE_METRIC, "miss_latency_ms", elapsed_ms)
+        incr_buffered_metric(EMBEDDING_CACHE_METRIC, "miss_texts", texts)
@@ -1,10 +1,19 @@
-from google import genai
+import time
 from google.genai import types
-import os
+from app.gemini.client import GeminiClient
+from app.gemini.embedding_cache import (
+    EmbeddingCache,
+    embedding_cache_key,
+    normalize_question,
+    EMBEDDING_CACHE_TTL_SECONDS,
+    QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+)
 
 
 GEMINI_EMBEDDING_MODEL = "text-embedding-004"
 GEMINI_EMBEDDING_DIMENSIONS = 768
+# Max number of contents accepted by a single batchEmbedContents request
+GEMINI_EMBEDDING_BATCH_LIMIT = 100
 
 
 def is_embedding_valid(embedding) -> bool:
@@ -26,30 +35,103 @@ def is_embedding_valid(embedding) -> bool:
 
 
 async def get_embeddings(text: str, title: str | None = None) -> list[float]:
-    try:
-        API_KEY = os.getenv("GEMINI_API_KEY", "")
-        client = genai.Client(api_key=API_KEY)
-        config = types.EmbedContentConfig(
-            task_type="RETRIEVAL_DOCUMENT",
-        )
-        if title:
-            config.title = title
-        result = await client.aio.models.embed_content(
+    """
+    Embed a single text, checking the embedding cache first.
+    """
+    embeddings = await get_embeddings_batch([text], title)
+    return embeddings[0]
+
+
+async def get_query_embedding(question: str) -> list[float]:
+    """
+    Embed a search question with the RETRIEVAL_QUERY task type.
+    Results are cached per normalized question for a short time so repeat questions skip Gemini,
+    the question itself is embedded as asked since case matters for names and IDs.
+    """
+    embeddings = await get_embeddings_batch(
+        [question],
+        task_type="RETRIEVAL_QUERY",
+        ttl_seconds=QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+        cache_texts=[normalize_question(question)],
+    )
+    return embeddings[0]
+
+
+async def _embed_uncached(
+    texts: list[str], task_type: str, title: str | None = None
+) -> list[list[float]]:
+    """
+    Embed texts with Gemini using as few embed_content requests as the batch limit allows.
+    """
+    config = types.EmbedContentConfig(
+        task_type=task_type,
+    )
+    if title:
+        config.title = title
+
+    embeddings: list[list[float]] = []
+    for start in range(0, len(texts), GEMINI_EMBEDDING_BATCH_LIMIT):
+        batch = texts[start : start + GEMINI_EMBEDDING_BATCH_LIMIT]
+        result = await GeminiClient.embed_content(
             model=GEMINI_EMBEDDING_MODEL,
-            contents=text,
+            contents=batch,
             config=config,
         )
 
-        if result.embeddings[0].values is None:
+        if not result.embeddings or len(result.embeddings) != len(batch):
             raise Exception("Something went wrong while getting embeddings")
 
-        embedding = result.embeddings[0].values
+        for item in result.embeddings:
+            if item.values is None or not is_embedding_valid(item.values):
+                raise Exception(
+                    f"Embedding validation failed - not a proper {GEMINI_EMBEDDING_DIMENSIONS}-dimensional array"
+                )
+            embeddings.append(item.values)
+
+    return embeddings
+
+
+async def get_embeddings_batch(
+    texts: list[str],
+    title: str | None = None,
+    task_type: str = "RETRIEVAL_DOCUMENT",
+    ttl_seconds: int = EMBEDDING_CACHE_TTL_SECONDS,
+    cache_texts: list[str] | None = None,
+) -> list[list[float]]:
+    """
+    Embed many texts, only texts missing from the embedding cache are sent to Gemini.
+    Returned embeddings are in the same order as the given texts.
+    Args:
+        cache_texts: Cache keys are built from these instead of texts, one per text
+    """
+    try:
+        keys = [
+            embedding_cache_key(text, GEMINI_EMBEDDING_MODEL, task_type, title)
+            for text in (cache_texts if cache_texts is not None else texts)
+        ]
+        cached = await EmbeddingCache.get_many(keys)
 
-        if not is_embedding_valid(embedding):
-            raise Exception(
-                f"Embedding validation failed - not a proper {GEMINI_EMBEDDING_DIMENSIONS}-dimensional array"
+        # Identical chunks within the same call are embedded once
+        missing: dict[str, str] = {}
+        for key, text, embedding in zip(keys, texts, cached):
+            if embedding is None and key not in missing:
+                missing[key] = text
+
+        fresh: dict[str, list[float]] = {}
+        if missing:
+            started_at = time.perf_counter()
+            new_embeddings = await _embed_uncached(
+                list(missing.values()), task_type, title
             )
-        return embedding
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+            fresh = dict(zip(missing.keys(), new_embeddings))
+            await EmbeddingCache.set_many(fresh, ttl_seconds)
+            EmbeddingCache.record_miss_latency(elapsed_ms, len(fresh))
+
+        return [
+            embedding if embedding is not None else fresh[key]
+            for key, embedding in zip(keys, cached)
+        ]
     except Exception as e:
-        print(f"Error getting embedding: {e}")
+        print(f"Error getting embeddings: {e}")
         raise e
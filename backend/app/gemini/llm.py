@@ -1,7 +1,9 @@
-from google import genai
 from google.genai import types
-from typing import Optional
-import os
+from typing import Optional, AsyncIterator
+from app.gemini.client import GeminiClient
+
+
+GEMINI_MODEL = "gemini-2.0-flash"
 
 
 async def llm(
@@ -17,12 +19,21 @@ async def llm(
     Returns:
         The generated text response
     """
-    MODEL = "gemini-2.0-flash"
-    API_KEY: str = os.getenv("GEMINI_API_KEY", "")
-    client: genai.Client = genai.Client(api_key=API_KEY)
-    config = config
-    response: types.GenerateContentResponse = await client.aio.models.generate_content(
-        model=MODEL, config=config, contents=prompt
+    response: types.GenerateContentResponse = await GeminiClient.generate_content(
+        model=GEMINI_MODEL, config=config, contents=prompt
     )
 
     return response
+
+
+async def llm_stream(
+    prompt: str, config: types.GenerateContentConfig
+) -> AsyncIterator[str]:
+    """
+    Generate content using the Gemini model and yield the text as it is generated.
+    """
+    async for chunk in GeminiClient.generate_content_stream(
+        model=GEMINI_MODEL, config=config, contents=prompt
+    ):
+        if chunk.text:
+            yield chunk.text
@@ -0,0 +1,84 @@
+import os
+from collections import OrderedDict
+from typing import Optional, cast
+import pymupdf
+
+
+# Document types PyMuPDF can extract text from, by file extension
+DOCUMENT_FILETYPES = {"pdf", "xps", "oxps", "epub", "mobi", "fb2"}
+_content_type_filetypes = {
+    "application/pdf": "pdf",
+    "application/vnd.ms-xpsdocument": "xps",
+    "application/oxps": "oxps",
+    "application/epub+zip": "epub",
+    "application/x-mobipocket-ebook": "mobi",
+}
+# Documents kept open per pool process. Reflowable formats (EPUB, MOBI, FB2) are laid out
+# in full when opened, reopening them for every page batch would repeat that each time.
+# Temp file paths are unique, a cached path always refers to the same document.
+_DOCUMENT_CACHE_SIZE = 2
+_open_documents: OrderedDict[str, pymupdf.Document] = OrderedDict()
+
+
+def document_filetype(name: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """
+    Returns:
+        The PyMuPDF filetype of an attachment, None if it is not a supported document
+    """
+    extension = os.path.splitext(name or "")[1].lower().lstrip(".")
+    if extension in DOCUMENT_FILETYPES:
+        return extension
+    return _content_type_filetypes.get((content_type or "").split(";")[0].strip().lower())
+
+
+def _open_document(path: str, filetype: str) -> pymupdf.Document:
+    """
+    Raises:
+        ValueError: If the file is not a readable document or is password protected
+    """
+    try:
+        document = pymupdf.open(path, filetype=filetype)
+    except Exception as e:
+        raise ValueError(f"Unreadable {filetype} document: {e}") from e
+    if document.needs_pass:
+        document.close()
+        raise ValueError("Document is password protected")
+    return document
+
+
+def _cached_document(path: str, filetype: str) -> pymupdf.Document:
+    document = _open_documents.get(path)
+    if document is not None:
+        _open_documents.move_to_end(path)
+        return document
+    document = _open_document(path, filetype)
+    _open_documents[path] = document
+    while len(_open_documents) > _DOCUMENT_CACHE_SIZE:
+        _, evicted = _open_documents.popitem(last=False)
+        evicted.close()
+    return document
+
+
+def document_page_count(path: str, filetype: str) -> int:
+    """
+    Raises:
+        ValueError: If the file is not a readable document or is password protected
+    """
+    return _cached_document(path, filetype).page_count
+
+
+def extract_pages_text(path: str, filetype: str, start: int, stop: int) -> list[str]:
+    """
+    Text of pages [start, stop), empty pages (scans) are left out.
+    Runs in the process pool, pages are loaded one at a time and released after their text
+    is read.
+    Raises:
+        ValueError: If the file is not a readable document or is password protected
+    """
+    document = _cached_document(path, filetype)
+    texts: list[str] = []
+    for page_number in range(start, min(stop, document.page_count)):
+        text = cast(str, document.load_page(page_number).get_text()).strip()
+        if text:
+            texts.append(text)
+    return texts
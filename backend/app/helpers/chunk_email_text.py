@@ -1,15 +1,70 @@
+from functools import lru_cache
+from typing import Iterator
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 
-def split_text_recursive(
-    text: str,
-    chunk_size: int = 1100,
-    chunk_overlap: int = 100,
-) -> list[str]:
-    split_text_recursive = RecursiveCharacterTextSplitter(
+# Very long texts are split window by window so chunks can be consumed as they are produced
+CHUNK_WINDOW_CHARS = 64 * 1024
+# Texts are chunked after remove_links, which collapses newlines into single spaces
+_window_separators = (". ", " ")
+
+
+@lru_cache(maxsize=8)
+def get_text_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """
+    Splitters hold no per-call state, build one per configuration and reuse it
+    """
+    return RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
         length_function=len,
         is_separator_regex=False,
     )
-    return split_text_recursive.split_text(text)
+
+
+def _window_end(text: str, start: int, window_chars: int) -> int:
+    end = start + window_chars
+    if end >= len(text):
+        return len(text)
+    for separator in _window_separators:
+        position = text.rfind(separator, start + window_chars // 2, end)
+        if position != -1:
+            return position + len(separator)
+    return end
+
+
+def iter_text_windows(text: str, window_chars: int = CHUNK_WINDOW_CHARS) -> Iterator[tuple[int, int]]:
+    """
+    Yield (start, end) of consecutive windows of the text, windows end on a separator.
+    """
+    start = 0
+    while start < len(text):
+        end = _window_end(text, start, window_chars)
+        yield start, end
+        start = end
+
+
+def split_text_window(window: str, chunk_size: int = 1100, chunk_overlap: int = 100) -> list[str]:
+    return get_text_splitter(chunk_size, chunk_overlap).split_text(window)
+
+
+def iter_text_chunks(
+    text: str,
+    chunk_size: int = 1100,
+    chunk_overlap: int = 100,
+    window_chars: int = CHUNK_WINDOW_CHARS,
+) -> Iterator[str]:
+    """
+    Yield the chunks of split_text_recursive, splitting one window of the text at a time.
+    Chunks never overlap across a window boundary.
+    """
+    for start, end in iter_text_windows(text, window_chars):
+        yield from split_text_window(text[start:end], chunk_size, chunk_overlap)
+
+
+def split_text_recursive(
+    text: str,
+    chunk_size: int = 1100,
+    chunk_overlap: int = 100,
+) -> list[str]:
+    return list(iter_text_chunks(text, chunk_size, chunk_overlap))
@@ -0,0 +1,238 @@
+import hashlib
+import re
+from html.parser import HTMLParser
+from typing import Optional
+from pydantic import BaseModel
+
+
+# A TextBody much shorter than the text of the HtmlBody is usually a "view this email in a browser" stub
+POOR_TEXT_BODY_RATIO = 0.5
+# Paragraphs shorter than this ("Thanks,", "Hi John") are too common to fingerprint
+MIN_FINGERPRINT_CHARS = 40
+
+# Start of quoted history in replies and forwards
+_history_marker_pattern = re.compile(
+    r"^\s*(?:"
+    r"On\b.{0,200}\bwrote:"
+    r"|-{2,}\s*(?:Original Message|Forwarded message)\s*-{2,}"
+    r"|Begin forwarded message:"
+    r")\s*$",
+    re.IGNORECASE,
+)
+# "On <date>, <name> wrote:" is often wrapped onto a second line by the client
+_wrapped_attribution_pattern = re.compile(r"^\s*On\b.{0,200}$", re.IGNORECASE)
+_wrote_pattern = re.compile(r"^.{0,200}\bwrote:\s*$", re.IGNORECASE)
+# Outlook starts the quoted message with a From:/Sent: header block
+_outlook_from_pattern = re.compile(r"^\s*\*?From:\*?\s", re.IGNORECASE)
+_outlook_sent_pattern = re.compile(r"^\s*\*?(?:Sent|Date):\*?\s", re.IGNORECASE)
+_quote_prefix_pattern = re.compile(r"^\s*(?:>\s?)+")
+_signature_delimiter_pattern = re.compile(r"^--\s*$")
+_mobile_signature_pattern = re.compile(
+    r"^\s*(?:Sent from my \w+.*|Get Outlook for \w+.*|Sent from (?:Mail|Yahoo Mail|Outlook) for .*)$",
+    re.IGNORECASE,
+)
+_footer_pattern = re.compile(
+    r"^\s*(?:CONFIDENTIALITY NOTICE|DISCLAIMER|This (?:e-?mail|message)(?: and any (?:files|attachments).{0,40})? (?:is|are|may be|contains?) (?:confidential|privileged|intended)|To unsubscribe|Unsubscribe\b)",
+    re.IGNORECASE,
+)
+_paragraph_split_pattern = re.compile(r"\n\s*\n")
+_whitespace_pattern = re.compile(r"\s+")
+_blank_lines_pattern = re.compile(r"\n{3,}")
+
+
+class _HTMLToText(HTMLParser):
+    """
+    Text of an HTML email, block elements become line breaks and
+    blockquote content is prefixed with "> " so quoted history is recognised.
+    """
+
+    _block_tags = {"div", "br", "li", "tr", "hr"}
+    _paragraph_tags = {"p", "h1", "h2", "h3", "h4", "h5", "h6", "table"}
+    _skip_tags = {"script", "style", "head", "title"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: list[str] = [""]
+        self.quote_depth = 0
+        self.skip_depth = 0
+
+    def _newline(self) -> None:
+        if self.lines[-1].strip():
+            self.lines.append("")
+
+    def _paragraph_break(self) -> None:
+        self._newline()
+        if len(self.lines) > 1 and self.lines[-2].strip():
+            self.lines.append("")
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._skip_tags:
+            self.skip_depth += 1
+        elif tag == "blockquote":
+            self._newline()
+            self.quote_depth += 1
+        elif tag in self._paragraph_tags:
+            self._paragraph_break()
+        elif tag in self._block_tags:
+            self._newline()
+
+    def handle_endtag(self, tag):
+        if tag in self._skip_tags:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag == "blockquote":
+            self._newline()
+            self.quote_depth = max(0, self.quote_depth - 1)
+        elif tag in self._paragraph_tags:
+            self._paragraph_break()
+        elif tag in self._block_tags:
+            self._newline()
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        text = _whitespace_pattern.sub(" ", data)
+        if not text.strip() and not self.lines[-1]:
+            return
+        if not self.lines[-1] and self.quote_depth:
+            self.lines[-1] = "> " * self.quote_depth
+        self.lines[-1] += text
+
+
+def html_to_text(html: str) -> str:
+    parser = _HTMLToText()
+    parser.feed(html)
+    parser.close()
+    return "\n".join(line.rstrip() for line in parser.lines).strip()
+
+
+def choose_body_text(text_body: Optional[str], html_body: Optional[str]) -> tuple[str, str]:
+    """
+    Returns:
+        (text, "text" or "html") - the HTML body is used when the TextBody is missing or a stub
+    """
+    text_body = text_body or ""
+    if not html_body:
+        return text_body, "text"
+    html_text = html_to_text(html_body)
+    if len(text_body.strip()) < len(html_text) * POOR_TEXT_BODY_RATIO:
+        return html_text, "html"
+    return text_body, "text"
+
+
+def normalize_paragraph(paragraph: str) -> str:
+    return _whitespace_pattern.sub(" ", paragraph).strip().lower()
+
+
+def split_paragraphs(text: str) -> list[str]:
+    return [paragraph for paragraph in _paragraph_split_pattern.split(text) if paragraph.strip()]
+
+
+def paragraph_fingerprint(paragraph: str) -> Optional[str]:
+    """
+    Fingerprint of a paragraph, None if it is too short to be meaningful
+    """
+    normalized = normalize_paragraph(_quote_prefix_pattern.sub("", paragraph))
+    if len(normalized) < MIN_FINGERPRINT_CHARS:
+        return None
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def paragraph_fingerprints(text: str) -> list[str]:
+    fingerprints = (paragraph_fingerprint(paragraph) for paragraph in split_paragraphs(text))
+    return [fingerprint for fingerprint in fingerprints if fingerprint]
+
+
+def _is_history_marker(lines: list[str], index: int) -> int:
+    """
+    Returns:
+        Number of lines the marker spans, 0 if lines[index] doesn't start one
+    """
+    line = lines[index]
+    if _history_marker_pattern.match(line):
+        return 1
+    if index + 1 < len(lines):
+        next_line = lines[index + 1]
+        if _wrapped_attribution_pattern.match(line) and _wrote_pattern.match(next_line):
+            return 2
+        if _outlook_from_pattern.match(line) and _outlook_sent_pattern.match(next_line):
+            return 2
+    return 0
+
+
+def split_quoted_history(text: str) -> tuple[str, list[str]]:
+    """
+    Separate the sender's own text from quoted history.
+    Everything after an attribution/forward marker is history until the next marker,
+    before the first marker each run of ">" quoted lines is a history block.
+    Returns:
+        (own text, history blocks with the quote prefixes removed)
+    """
+    lines = text.splitlines()
+    own: list[str] = []
+    history: list[list[str]] = []
+    in_marked_history = False
+    in_quote_block = False
+    index = 0
+    while index < len(lines):
+        marker_lines = _is_history_marker(lines, index)
+        if marker_lines:
+            history.append([])
+            in_marked_history = True
+            index += marker_lines
+            continue
+        line = lines[index]
+        if in_marked_history:
+            history[-1].append(_quote_prefix_pattern.sub("", line))
+        elif line.lstrip().startswith(">"):
+            if not in_quote_block:
+                history.append([])
+                in_quote_block = True
+            history[-1].append(_quote_prefix_pattern.sub("", line))
+        else:
+            in_quote_block = False
+            own.append(line)
+        index += 1
+
+    blocks = ["\n".join(block).strip() for block in history]
+    return "\n".join(own).strip(), [block for block in blocks if block]
+
+
+def strip_signature(text: str) -> str:
+    """
+    Drop the signature ("-- " delimiter), mobile client signatures and legal/unsubscribe
+    footers in the last third of the text.
+    """
+    lines = text.splitlines()
+    for index, line in enumerate(lines):
+        if _signature_delimiter_pattern.match(line):
+            lines = lines[:index]
+            break
+    lines = [line for line in lines if not _mobile_signature_pattern.match(line)]
+
+    footer_from = len(lines) - max(1, len(lines) // 3)
+    for index in range(max(0, footer_from), len(lines)):
+        if _footer_pattern.match(lines[index]):
+            lines = lines[:index]
+            break
+    return _blank_lines_pattern.sub("\n\n", "\n".join(lines)).strip()
+
+
+class EmailParts(BaseModel):
+    own_text: str
+    history: list[str]
+    source: str
+    original_chars: int
+
+
+def prepare_email_parts(text_body: Optional[str], html_body: Optional[str]) -> EmailParts:
+    """
+    CPU only part of the normalization, safe to run in the process pool
+    """
+    text, source = choose_body_text(text_body, html_body)
+    own_text, history = split_quoted_history(text)
+    return EmailParts(
+        own_text=strip_signature(own_text),
+        history=[strip_signature(block) for block in history],
+        source=source,
+        original_chars=len(text),
+    )
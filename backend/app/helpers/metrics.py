@@ -0,0 +1,109 @@
+import asyncio
+import os
+from typing import cast
+from app.database.redis_connect import RedisConnection
+
+
+# In-process counters, grouped by metric name
+_local_metrics: dict[str, dict[str, float]] = {}
+# Buffered increments not yet added to Redis, see flush_metrics
+_pending_metrics: dict[str, dict[str, float]] = {}
+
+METRICS_KEY_PREFIX = "metrics:"
+# Names of every metric written to Redis, so reading them needs no SCAN
+METRICS_REGISTRY_KEY = "metrics_registry"
+METRICS_FLUSH_INTERVAL_SECONDS = float(os.getenv("METRICS_FLUSH_INTERVAL_SECONDS", "10"))
+
+
+def _count(metrics: dict[str, dict[str, float]], name: str, field: str, amount: float) -> None:
+    counters = metrics.setdefault(name, {})
+    counters[field] = counters.get(field, 0) + amount
+
+
+async def _add_to_redis(metrics: dict[str, dict[str, float]]) -> None:
+    redis_instance = await RedisConnection.connect()
+    async with redis_instance.pipeline(transaction=False) as pipe:
+        pipe.sadd(METRICS_REGISTRY_KEY, *metrics.keys())
+        for name, counters in metrics.items():
+            for field, amount in counters.items():
+                if isinstance(amount, int):
+                    pipe.hincrby(f"{METRICS_KEY_PREFIX}{name}", field, amount)
+                else:
+                    pipe.hincrbyfloat(f"{METRICS_KEY_PREFIX}{name}", field, amount)
+        await pipe.execute()
+
+
+async def incr_metric(name: str, field: str, amount: float = 1) -> None:
+    """
+    Increment a counter both in-process and in the shared Redis hash `metrics:<name>`,
+    so counts from the API and worker processes add up.
+    Metrics must never break the caller, Redis errors are only logged.
+    """
+    _count(_local_metrics, name, field, amount)
+    try:
+        await _add_to_redis({name: {field: amount}})
+    except Exception as e:
+        print(f"Error updating metric {name}.{field}: {e}")
+
+
+def incr_buffered_metric(name: str, field: str, amount: float = 1) -> None:
+    """
+    Like incr_metric, but the Redis update is batched with others by flush_metrics.
+    For hot paths where a Redis round trip per call is too much.
+    """
+    _count(_local_metrics, name, field, amount)
+    _count(_pending_metrics, name, field, amount)
+
+
+async def flush_metrics() -> None:
+    """
+    Add the buffered increments to Redis in one round trip.
+    """
+    if not _pending_metrics:
+        return
+    pending = dict(_pending_metrics)
+    _pending_metrics.clear()
+    try:
+        await _add_to_redis(pending)
+    except Exception as e:
+        print(f"Error flushing metrics: {e}")
+
+
+async def run_metrics_flusher() -> None:
+    """
+    Flush buffered metrics every METRICS_FLUSH_INTERVAL_SECONDS, run as a task
+    in the API and worker processes.
+    """
+    try:
+        while True:
+            await asyncio.sleep(METRICS_FLUSH_INTERVAL_SECONDS)
+            await flush_metrics()
+    finally:
+        await flush_metrics()
+
+
+def incr_local_metric(name: str, field: str, amount: float = 1) -> None:
+    """
+    Increment an in-process counter only, for hot paths where a Redis round trip per call is too much
+    """
+    _count(_local_metrics, name, field, amount)
+
+
+def get_local_metrics() -> dict[str, dict[str, float]]:
+    """
+    Counters recorded by this process only
+    """
+    return {name: dict(counters) for name, counters in _local_metrics.items()}
+
+
+async def get_metrics() -> dict[str, dict[str, str]]:
+    """
+    Counters aggregated across all processes
+    """
+    redis_instance = await RedisConnection.connect()
+    names = sorted(cast(set[str], await redis_instance.smembers(METRICS_REGISTRY_KEY)))
+    async with redis_instance.pipeline(transaction=False) as pipe:
+        for name in names:
+            pipe.hgetall(f"{METRICS_KEY_PREFIX}{name}")
+        values = await pipe.execute()
+    return dict(zip(names, values))
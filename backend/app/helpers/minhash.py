@@ -0,0 +1,79 @@
+import hashlib
+import re
+import zlib
+import numpy as np
+
+
+MINHASH_PERMUTATIONS = 128
+# LSH banding, two emails become candidates when all rows of one band match.
+# 32 bands of 4 rows catch pairs from about 0.42 Jaccard similarity upwards.
+MINHASH_BANDS = 32
+MINHASH_ROWS = MINHASH_PERMUTATIONS // MINHASH_BANDS
+SHINGLE_WORDS = 5
+
+# Multiply-shift hashing, (a * x + b) mod 2^64 keeping the top 32 bits, needs no division.
+# Fixed seed, signatures are stored and compared across processes and deploys
+_random = np.random.default_rng(20240601)
+_a = _random.integers(1, 2**63, size=MINHASH_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_b = _random.integers(0, 2**63, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_SHIFT = np.uint64(32)
+_LOW_32_BITS = np.uint64(0xFFFFFFFF)
+_SHINGLE_BASE = np.uint64(1000003)
+# Permutations processed at once, bounds the temporary (shingles x permutations) matrix
+_PERMUTATION_BLOCK = 32
+
+_word_pattern = re.compile(r"\w+")
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """
+    32 bit hashes of every SHINGLE_WORDS long word window, lower cased.
+    Each distinct word is hashed once, windows are combined with a polynomial over the
+    word hashes. Repeated windows are not removed, they don't change the minimums.
+    """
+    words = _word_pattern.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    vocabulary = {word: zlib.crc32(word.encode("utf-8")) for word in set(words)}
+    word_hashes = np.fromiter(
+        (vocabulary[word] for word in words), dtype=np.uint64, count=len(words)
+    )
+    window = min(SHINGLE_WORDS, len(words))
+    count = len(words) - window + 1
+    shingles = np.zeros(count, dtype=np.uint64)
+    for offset in range(window):
+        shingles = shingles * _SHINGLE_BASE + word_hashes[offset : offset + count]
+    # Fold to 32 bits so multiply-shift hashing below stays well distributed
+    return (shingles >> _SHIFT) ^ (shingles & _LOW_32_BITS)
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """
+    MinHash signature of the text, MINHASH_PERMUTATIONS uint32 values.
+    The share of equal values between two signatures estimates their Jaccard similarity.
+    """
+    shingles = shingle_hashes(text)
+    signature = np.full(MINHASH_PERMUTATIONS, np.iinfo(np.uint32).max, dtype=np.uint32)
+    if shingles.size == 0:
+        return signature
+    for start in range(0, MINHASH_PERMUTATIONS, _PERMUTATION_BLOCK):
+        a = _a[start : start + _PERMUTATION_BLOCK, None]
+        b = _b[start : start + _PERMUTATION_BLOCK, None]
+        hashed = (a * shingles[None, :] + b) >> _SHIFT
+        signature[start : start + _PERMUTATION_BLOCK] = hashed.min(axis=1)
+    return signature
+
+
+def signature_similarity(first: np.ndarray, second: np.ndarray) -> float:
+    return float(np.mean(first == second))
+
+
+def lsh_band_keys(signature: np.ndarray) -> list[str]:
+    """
+    One key per band, emails sharing any key are near-duplicate candidates
+    """
+    rows = signature.reshape(MINHASH_BANDS, MINHASH_ROWS)
+    return [
+        f"{band}:{hashlib.blake2b(rows[band].tobytes(), digest_size=8).hexdigest()}"
+        for band in range(MINHASH_BANDS)
+    ]
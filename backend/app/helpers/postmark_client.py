@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+from typing import Any, Optional, cast
+import httpx
+from app.database.redis_connect import RedisConnection
+
+
+# Point this at a local stub server for testing
+POSTMARK_API_BASE_URL = os.getenv("POSTMARK_API_BASE_URL", "https://api.postmarkapp.com")
+POSTMARK_SERVER_TOKEN: str = os.getenv("POSTMARK_SERVER_TOKEN", "")
+# Postmark accepts at most 500 messages per batch request
+POSTMARK_BATCH_LIMIT = 500
+# How long to wait for more messages before sending a batch
+POSTMARK_BATCH_WINDOW_SECONDS = float(os.getenv("POSTMARK_BATCH_WINDOW_MS", "50")) / 1000
+POSTMARK_RETRY_KEY = "postmark:retry"
+POSTMARK_RETRY_INTERVAL_SECONDS = int(os.getenv("POSTMARK_RETRY_INTERVAL_SECONDS", "30"))
+# The retry loop slows down to this interval while the spool is empty or unreadable
+POSTMARK_RETRY_MAX_INTERVAL_SECONDS = int(
+    os.getenv("POSTMARK_RETRY_MAX_INTERVAL_SECONDS", "300")
+)
+# How long stop() waits for queued messages to go out before spooling them to Redis
+POSTMARK_STOP_TIMEOUT_SECONDS = float(os.getenv("POSTMARK_STOP_TIMEOUT_SECONDS", "10"))
+POSTMARK_MAX_ATTEMPTS = int(os.getenv("POSTMARK_MAX_ATTEMPTS", "5"))
+POSTMARK_DEAD_LETTER_KEY = "postmark:dead"
+
+
+class PostmarkClient:
+    """
+    Async outbound mail service.
+    Messages are queued in-process and sent by a background task over a pooled connection,
+    several queued messages go out in one /email/batch request.
+    Messages that fail to send are spooled to Redis and retried.
+    Messages are only in memory until they are sent or spooled, those still queued when the
+    process crashes are lost. stop() spools whatever it could not send in time.
+    """
+
+    _client: Optional[httpx.AsyncClient] = None
+    _queue: Optional[asyncio.Queue] = None
+    _sender_task: Optional[asyncio.Task] = None
+    _retry_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def start(cls) -> None:
+        """Open the connection pool and start the sender and retry tasks."""
+        if cls._client is None:
+            cls._client = httpx.AsyncClient(
+                base_url=POSTMARK_API_BASE_URL,
+                headers={
+                    "Accept": "application/json",
+                    "Content-Type": "application/json",
+                    "X-Postmark-Server-Token": POSTMARK_SERVER_TOKEN,
+                },
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+                timeout=httpx.Timeout(15.0),
+            )
+            cls._queue = asyncio.Queue()
+            cls._sender_task = asyncio.create_task(cls._sender_loop())
+            cls._retry_task = asyncio.create_task(cls._retry_loop())
+            print("✅ Postmark client started")
+
+    @classmethod
+    async def stop(cls) -> None:
+        """Send whatever is still queued, then close the pool."""
+        if cls._client is None:
+            return
+        if cls._queue is not None:
+            try:
+                await asyncio.wait_for(cls._queue.join(), POSTMARK_STOP_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                print("Postmark is not draining the queue, spooling what is left")
+        for task in (cls._sender_task, cls._retry_task):
+            if task:
+                task.cancel()
+        if cls._queue is not None:
+            unsent = []
+            while not cls._queue.empty():
+                unsent.append(cls._queue.get_nowait())
+            if unsent:
+                await cls._spool(unsent)
+        await cls._client.aclose()
+        cls._client = None
+        cls._queue = None
+        print("Postmark client stopped")
+
+    @classmethod
+    async def enqueue(cls, message: dict[str, Any]) -> None:
+        """
+        Queue a message for sending, returns without waiting for Postmark.
+        """
+        if cls._queue is None:
+            await cls.start()
+        assert cls._queue is not None
+        await cls._queue.put(message)
+
+    @classmethod
+    async def _next_batch(cls) -> list[dict[str, Any]]:
+        assert cls._queue is not None
+        batch = [await cls._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + POSTMARK_BATCH_WINDOW_SECONDS
+        while len(batch) < POSTMARK_BATCH_LIMIT:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(cls._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    @classmethod
+    async def _sender_loop(cls) -> None:
+        while True:
+            batch = await cls._next_batch()
+            try:
+                failed = await cls.send_now(batch)
+                if failed:
+                    await cls._spool(failed)
+            except Exception as e:
+                print(f"Error sending {len(batch)} emails: {e}")
+                await cls._spool(batch)
+            finally:
+                assert cls._queue is not None
+                for _ in batch:
+                    cls._queue.task_done()
+
+    @classmethod
+    async def send_now(cls, messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Send messages right away, one message uses /email, several use /email/batch.
+        Returns:
+            The messages Postmark rejected
+        """
+        if cls._client is None:
+            await cls.start()
+        assert cls._client is not None
+        # _attempts is our own retry bookkeeping, Postmark doesn't need it
+        payloads = [
+            {key: value for key, value in message.items() if key != "_attempts"}
+            for message in messages
+        ]
+
+        if len(messages) == 1:
+            response = await cls._client.post("/email", json=payloads[0])
+            if response.status_code != 200:
+                print(f"Failed to send email: {response.text}")
+                return messages
+            return []
+
+        response = await cls._client.post("/email/batch", json=payloads)
+        if response.status_code != 200:
+            print(f"Failed to send email batch: {response.text}")
+            return messages
+        results = response.json()
+        failed = []
+        for message, result in zip(messages, results):
+            if result.get("ErrorCode", 0) != 0:
+                print(f"Failed to send email to {message.get('To')}: {result.get('Message')}")
+                failed.append(message)
+        return failed
+
+    @classmethod
+    async def _spool(cls, messages: list[dict[str, Any]]) -> None:
+        """
+        Save failed messages in Redis for the retry loop.
+        """
+        try:
+            redis_instance = await RedisConnection.connect()
+            for message in messages:
+                attempts = message.pop("_attempts", 0) + 1
+                key = POSTMARK_RETRY_KEY
+                if attempts >= POSTMARK_MAX_ATTEMPTS:
+                    key = POSTMARK_DEAD_LETTER_KEY
+                await redis_instance.rpush(
+                    key, json.dumps({"attempts": attempts, "message": message})
+                )
+        except Exception as e:
+            print(f"Error spooling {len(messages)} failed emails: {e}")
+
+    @classmethod
+    async def _retry_loop(cls) -> None:
+        interval = POSTMARK_RETRY_INTERVAL_SECONDS
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                redis_instance = await RedisConnection.connect()
+                spooled = cast(
+                    Optional[list[str]],
+                    await redis_instance.lpop(POSTMARK_RETRY_KEY, POSTMARK_BATCH_LIMIT),
+                )
+                for item in spooled or []:
+                    data = json.loads(item)
+                    await cls.enqueue({**data["message"], "_attempts": data["attempts"]})
+            except Exception as e:
+                print(f"Error retrying spooled emails: {e}")
+                spooled = None
+            if spooled:
+                interval = POSTMARK_RETRY_INTERVAL_SECONDS
+            else:
+                interval = min(interval * 2, POSTMARK_RETRY_MAX_INTERVAL_SECONDS)
@@ -0,0 +1,67 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+
+class ProcessPool:
+    """
+    Lazily created process pool for CPU heavy work that must not run on the event loop.
+    A pool broken by a crashed or killed child is replaced on the next call.
+    Workers are started by a forkserver, forking the API/worker process after LanceDB's
+    runtime threads and the HTTP clients started can deadlock the child.
+    Call shutdown() on application/worker shutdown.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def get(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _terminate(self, executor: ProcessPoolExecutor) -> None:
+        """
+        Kill the children of a pool, a timed out call would keep its process busy otherwise.
+        ProcessPoolExecutor has no public way to do this before Python 3.14.
+        """
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    async def run(self, func: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Run func(*args) in the pool.
+        Raises:
+            BrokenProcessPool: If a child died, the pool is replaced for the next call
+            TimeoutError: If the call took longer than timeout seconds, the pool is
+                replaced and its children are killed
+        """
+        executor = self.get()
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(executor, func, *args), timeout)
+        except BrokenProcessPool:
+            print(f"{self.name} process pool broke, replacing it")
+            if self._executor is executor:
+                self._executor = None
+            raise
+        except asyncio.TimeoutError:
+            print(f"{self.name} process pool call timed out after {timeout}s, replacing the pool")
+            if self._executor is executor:
+                self._executor = None
+            self._terminate(executor)
+            raise
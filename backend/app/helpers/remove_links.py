@@ -1,5 +1,17 @@
 import re
 
+# Pattern to match URLs (http, https, ftp, www, etc.)
+_url_pattern = re.compile(
+    r'https?://[^\s<>"{}|\\^`\[\]]+|www\.[^\s<>"{}|\\^`\[\]]+|ftp://[^\s<>"{}|\\^`\[\]]+',
+    re.IGNORECASE,
+)
+
+# Pattern to match email addresses
+_email_pattern = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+
+_whitespace_pattern = re.compile(r'\s+')
+
+
 def remove_links(text: str) -> str:
     """
     Remove URLs and email addresses from the given text.
@@ -13,20 +25,14 @@ def remove_links(text: str) -> str:
     if not text:
         return text
     
-    # Pattern to match URLs (http, https, ftp, www, etc.)
-    url_pattern = r'https?://[^\s<>"{}|\\^`\[\]]+|www\.[^\s<>"{}|\\^`\[\]]+|ftp://[^\s<>"{}|\\^`\[\]]+'
-    
-    # Pattern to match email addresses
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    
     # Remove URLs
-    text = re.sub(url_pattern, '', text, flags=re.IGNORECASE)
+    text = _url_pattern.sub('', text)
     
     # Remove email addresses
-    text = re.sub(email_pattern, '', text)
+    text = _email_pattern.sub('', text)
     
     # Clean up extra whitespace that might be left after removing links
-    text = re.sub(r'\s+', ' ', text)
+    text = _whitespace_pattern.sub(' ', text)
     text = text.strip()
     
-    return text
\ No newline at end of file
+    return text
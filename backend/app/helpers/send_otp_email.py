@@ -1,7 +1,7 @@
 from app.helpers.sendemail import sendemail
 
 
-def send_otp_email(user_email: str, otp_code: str) -> None:
+async def send_otp_email(user_email: str, otp_code: str) -> None:
     """
     Sends an OTP (One-Time Password) email to users for verification.
 
@@ -35,4 +35,4 @@ def send_otp_email(user_email: str, otp_code: str) -> None:
         </p>
     </div>
     """
-    sendemail(user_email, subject, otp_html)
+    await sendemail(user_email, subject, otp_html)
@@ -1,7 +1,7 @@
 from app.helpers.sendemail import sendemail
 
 
-def send_welcome_email(user_email: str, username: str) -> None:
+async def send_welcome_email(user_email: str, username: str) -> None:
     """
     Sends a welcome email to new users with instructions on how to use Inbox Memory AI.
 
@@ -42,4 +42,4 @@ def send_welcome_email(user_email: str, username: str) -> None:
         </p>
     </div>
     """
-    sendemail(user_email, subject, welcome_html)
+    await sendemail(user_email, subject, welcome_html)
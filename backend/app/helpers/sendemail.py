@@ -1,37 +1,25 @@
-import requests
-import os
-from typing import Optional
+import asyncio
+from app.helpers.postmark_client import PostmarkClient
 
 
-POSTMARK_API_URL = "https://api.postmarkapp.com/email"
-POSTMARK_SERVER_TOKEN: str = os.getenv("POSTMARK_SERVER_TOKEN", "")
-
-
-def sendemail(
+async def sendemail(
     to_email: str,
     subject: str,
     html_body: str,
 ) -> None:
     """
-    Send email using Postmark API
+    Queue an email to be sent with the Postmark API.
+    Returns as soon as the message is queued, PostmarkClient sends it in the background
+    and retries it if Postmark fails.
 
     Args:
         to_email (str): Recipient email address
         subject (str): Email subject
         html_body (str): HTML content of the email
-
-    Raises:
-        Exception: If the API request fails
     """
     from_email: str = "ai@kbhelper.com"
     message_stream: str = "outbound"
 
-    headers: dict[str, str] = {
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-        "X-Postmark-Server-Token": POSTMARK_SERVER_TOKEN,
-    }
-
     payload: dict[str, str] = {
         "From": from_email,
         "To": to_email,
@@ -40,15 +28,10 @@ def sendemail(
         "MessageStream": message_stream,
     }
 
-    response = requests.post(
-        POSTMARK_API_URL, headers=headers, json=payload, verify=False
-    )
+    await PostmarkClient.enqueue(payload)
 
-    if response.status_code != 200:
-        raise Exception(f"Failed to send email: {response.text}")
 
-
-if __name__ == "__main__":
+async def main() -> None:
     # Test HTML content
     email_content = """
     <html>
@@ -61,11 +44,17 @@ if __name__ == "__main__":
     """
 
     try:
-        sendemail(
+        await PostmarkClient.start()
+        await sendemail(
             to_email="ashiqdrive@gmail.com",
             subject="Inbox Memory AI - Email Test",
             html_body=email_content,
         )
+        await PostmarkClient.stop()
         print("Test email sent successfully!")
     except Exception as e:
         print(f"Failed to send test email: {str(e)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+import os
+from typing import AsyncIterator
+from app.helpers.process_pool import ProcessPool
+from app.helpers.remove_links import remove_links
+from app.helpers.chunk_email_text import iter_text_chunks, iter_text_windows, split_text_window
+
+
+# Texts longer than this are cleaned and split in a worker process so the event loop stays responsive
+TEXT_PREP_PROCESS_THRESHOLD_CHARS = int(
+    os.getenv("TEXT_PREP_PROCESS_THRESHOLD_CHARS", str(200 * 1024))
+)
+TEXT_PREP_PROCESSES = int(os.getenv("TEXT_PREP_PROCESSES", "2"))
+
+
+# CPU heavy text preparation, kept apart from attachment parsing
+TextPreparationPool = ProcessPool("Text preparation", TEXT_PREP_PROCESSES)
+
+
+async def remove_links_async(text: str) -> str:
+    """
+    remove_links, in the process pool for large texts
+    """
+    if len(text) <= TEXT_PREP_PROCESS_THRESHOLD_CHARS:
+        return remove_links(text)
+    return await TextPreparationPool.run(remove_links, text)
+
+
+async def prepare_text_chunks(text: str) -> AsyncIterator[str]:
+    """
+    Yield the chunks of the text ready for embedding.
+    Small texts are chunked in-process, large ones one window at a time in the process pool,
+    so only a single window's chunks are held besides the text itself.
+    """
+    if len(text) <= TEXT_PREP_PROCESS_THRESHOLD_CHARS:
+        for chunk in iter_text_chunks(text):
+            yield chunk
+        return
+    for start, end in iter_text_windows(text):
+        for chunk in await TextPreparationPool.run(split_text_window, text[start:end]):
+            yield chunk
@@ -1,8 +1,17 @@
-from datetime import datetime
-from typing import List
+import asyncio
+import os
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Optional
 from lancedb.pydantic import Vector, LanceModel
 import lancedb
-from pydantic import BaseModel
+import numpy as np
+import pyarrow as pa
+from pydantic import BaseModel, ConfigDict, Field
+from app.database.redis_connect import RedisConnection
 
 
 class TextEmbeddingSchema(LanceModel):
@@ -12,6 +21,15 @@ class TextEmbeddingSchema(LanceModel):
     text: str
     chunk_sequence: int
     created_at: datetime
+    # File name for chunks of an attachment, None for the email body.
+    # Each attachment numbers its chunks from 0.
+    attachment_name: Optional[str] = None
+
+
+class SharedTextEmbeddingSchema(TextEmbeddingSchema):
+    """Row of a shared table, holds the chunks of many users"""
+
+    user_id: str
 
 
 class VectorSearchResult(BaseModel):
@@ -19,9 +37,228 @@ class VectorSearchResult(BaseModel):
     text: str
     chunk_sequence: int
     created_at: datetime
+    attachment_name: Optional[str] = None
+    # Distance to the query vector, only set by vector_search (lower is closer)
+    distance: Optional[float] = None
+    # Fused reciprocal rank fusion score, only set by hybrid_search (higher is better)
+    score: Optional[float] = None
+    # Chunk embedding, only set when a search is asked for vectors (used for MMR re-ranking)
+    vector: Optional[np.ndarray] = Field(default=None, exclude=True, repr=False)
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
 
 
 DB_PATH = "lance_storage/default-db"
+# Max number of per-user table handles kept open
+LANCE_TABLE_POOL_SIZE = int(os.getenv("LANCE_TABLE_POOL_SIZE", "256"))
+# Open handles unused for this long are dropped from the pool
+LANCE_TABLE_IDLE_SECONDS = int(os.getenv("LANCE_TABLE_IDLE_SECONDS", "600"))
+# How often a handle checks for versions written by other processes (the worker)
+LANCE_READ_CONSISTENCY_SECONDS = float(os.getenv("LANCE_READ_CONSISTENCY_SECONDS", "5"))
+# ANN search knobs, only used once a table has a vector index (see background_jobs/index_manager.py)
+# Higher values improve recall at the cost of latency
+LANCE_SEARCH_NPROBES = int(os.getenv("LANCE_SEARCH_NPROBES", "20"))
+LANCE_SEARCH_REFINE_FACTOR = int(os.getenv("LANCE_SEARCH_REFINE_FACTOR", "0"))
+# Tables written to within this window are skipped by maintenance (compaction/cleanup)
+LANCE_WRITE_QUIET_SECONDS = int(os.getenv("LANCE_WRITE_QUIET_SECONDS", "120"))
+# "per_user" keeps one table per user, "shared" puts every user's chunks into
+# LANCE_SHARED_PARTITIONS tables with a user_id column.
+# Move existing data with script_for_lance_layout_migration.py before switching.
+LANCE_STORAGE_LAYOUT = os.getenv("LANCE_STORAGE_LAYOUT", "per_user")
+# Changing this after data was written needs a re-run of the migration
+LANCE_SHARED_PARTITIONS = int(os.getenv("LANCE_SHARED_PARTITIONS", "1"))
+SHARED_TABLE_PREFIX = "shared_chunks_"
+
+
+class LanceConnection:
+    """
+    One async LanceDB connection per process and an LRU pool of open table handles.
+    Table name is the user_id, or a shared table name (see resolve_user_table).
+    """
+
+    _db: Optional[lancedb.AsyncConnection] = None
+    _tables: OrderedDict[str, tuple[lancedb.AsyncTable, float]] = OrderedDict()
+    _open_locks: dict[str, asyncio.Lock] = {}
+
+    @classmethod
+    async def connect(cls) -> lancedb.AsyncConnection:
+        """Open the LanceDB connection if needed and return it."""
+        if cls._db is None:
+            cls._db = await lancedb.connect_async(
+                DB_PATH,
+                read_consistency_interval=timedelta(
+                    seconds=LANCE_READ_CONSISTENCY_SECONDS
+                ),
+            )
+            print("✅ Connected to LanceDB")
+        return cls._db
+
+    @classmethod
+    async def disconnect(cls) -> None:
+        """Close every open table handle and the connection."""
+        for table, _ in cls._tables.values():
+            table.close()
+        cls._tables.clear()
+        cls._open_locks.clear()
+        if cls._db:
+            cls._db.close()
+            cls._db = None
+            print("Disconnected from LanceDB")
+
+    @classmethod
+    def _evict(cls) -> None:
+        """
+        Drop handles from the pool without closing them, a coroutine may still be
+        searching or writing through one. It is closed once the last reference is gone.
+        """
+        now = time.monotonic()
+        for name, (_, last_used) in list(cls._tables.items()):
+            if now - last_used > LANCE_TABLE_IDLE_SECONDS:
+                del cls._tables[name]
+        while len(cls._tables) > LANCE_TABLE_POOL_SIZE:
+            cls._tables.popitem(last=False)
+
+    @classmethod
+    def _get_cached(cls, table_name: str) -> Optional[lancedb.AsyncTable]:
+        cached = cls._tables.get(table_name)
+        if cached is None:
+            return None
+        table = cached[0]
+        cls._tables[table_name] = (table, time.monotonic())
+        cls._tables.move_to_end(table_name)
+        return table
+
+    @classmethod
+    async def get_table(cls, table_name: str) -> lancedb.AsyncTable:
+        """
+        Return an open handle for the table, creating the table on first use.
+        Opening/creating is single-flight per table so concurrent first writes don't race.
+        """
+        table = cls._get_cached(table_name)
+        if table is not None:
+            return table
+
+        lock = cls._open_locks.setdefault(table_name, asyncio.Lock())
+        async with lock:
+            # Another coroutine may have opened it while we waited
+            table = cls._get_cached(table_name)
+            if table is not None:
+                return table
+
+            db = await cls.connect()
+            try:
+                table = await db.open_table(table_name)
+                await _ensure_attachment_column(table)
+            except ValueError:
+                # Table does not exist yet
+                schema = (
+                    SharedTextEmbeddingSchema
+                    if is_shared_table_name(table_name)
+                    else TextEmbeddingSchema
+                )
+                table = await db.create_table(table_name, schema=schema, exist_ok=True)
+            cls._tables[table_name] = (table, time.monotonic())
+            cls._evict()
+        cls._open_locks.pop(table_name, None)
+        return table
+
+
+async def _ensure_attachment_column(table: lancedb.AsyncTable) -> None:
+    """Tables created before attachment ingestion have no attachment_name column"""
+    schema = await table.schema()
+    if "attachment_name" not in schema.names:
+        await table.add_columns({"attachment_name": "CAST(NULL AS STRING)"})
+
+
+def is_shared_table_name(table_name: str) -> bool:
+    return table_name.startswith(SHARED_TABLE_PREFIX)
+
+
+def get_shared_table_name(user_id: str) -> str:
+    """crc32 is stable across processes, unlike hash()"""
+    partition = zlib.crc32(user_id.encode("utf-8")) % LANCE_SHARED_PARTITIONS
+    return f"{SHARED_TABLE_PREFIX}{partition}"
+
+
+def resolve_user_table(user_id: str) -> tuple[str, Optional[str]]:
+    """
+    Map a user to the physical table holding their chunks.
+    Returns:
+        (table name, filter to apply) - the filter is None for the per-user layout
+    Raises:
+        ValueError: If user_id is not a UUID, it ends up inside a filter expression
+    """
+    user_id = str(uuid.UUID(str(user_id)))
+    if LANCE_STORAGE_LAYOUT != "shared":
+        return user_id, None
+    return get_shared_table_name(user_id), f"user_id = '{user_id}'"
+
+
+def _and_filter(user_filter: Optional[str], where: str) -> str:
+    return f"({user_filter}) AND ({where})" if user_filter else where
+
+
+SEARCH_RESULT_COLUMNS = [
+    "email_ref_id",
+    "chunk_sequence",
+    "text",
+    "created_at",
+    "attachment_name",
+]
+
+
+def search_columns(with_vectors: bool) -> list[str]:
+    return SEARCH_RESULT_COLUMNS + ["vector"] if with_vectors else SEARCH_RESULT_COLUMNS
+
+
+def search_results_from_arrow(results: pa.Table) -> List[VectorSearchResult]:
+    """
+    Build results column by column straight from the Arrow buffers.
+    Rows come from Lance with the schema we wrote, so pydantic validation is skipped.
+    A selected vector column becomes one float32 matrix, each result holds a view of its row.
+    """
+    distances = (
+        results.column("_distance").to_pylist()
+        if "_distance" in results.column_names
+        else [None] * results.num_rows
+    )
+    vectors = (
+        results.column("vector")
+        .combine_chunks()
+        .flatten()
+        .to_numpy()
+        .reshape(results.num_rows, -1)
+        if "vector" in results.column_names and results.num_rows
+        else [None] * results.num_rows
+    )
+    return [
+        VectorSearchResult.model_construct(
+            email_ref_id=email_ref_id,
+            chunk_sequence=chunk_sequence,
+            text=text,
+            created_at=created_at,
+            attachment_name=attachment_name,
+            distance=distance,
+            vector=vector,
+        )
+        for (
+            email_ref_id,
+            chunk_sequence,
+            text,
+            created_at,
+            attachment_name,
+            distance,
+            vector,
+        ) in zip(
+            results.column("email_ref_id").to_pylist(),
+            results.column("chunk_sequence").to_pylist(),
+            results.column("text").to_pylist(),
+            results.column("created_at").to_pylist(),
+            results.column("attachment_name").to_pylist(),
+            distances,
+            vectors,
+        )
+    ]
 
 
 # Function to create and get table
@@ -30,20 +267,50 @@ async def get_or_create_table(table_name: str = "default_table"):
     Table name is the user_id.
     Lance stores the data in a files and folder with the name of the table.
     """
-    # Connect to local LanceDB
-    db = await lancedb.connect_async(DB_PATH)
+    return await LanceConnection.get_table(table_name)
+
 
-    # Create table if it doesn't exist
+async def mark_table_written(table_name: str) -> None:
+    """
+    Record that the table has active writes so maintenance leaves it alone for a while.
+    """
     try:
-        table = await db.open_table(table_name)
-    except:
-        table = await db.create_table(table_name, schema=TextEmbeddingSchema)
-    return table
+        redis_instance = await RedisConnection.connect()
+        await redis_instance.setex(
+            f"lance:written:{table_name}", LANCE_WRITE_QUIET_SECONDS, "1"
+        )
+    except Exception as e:
+        print(f"Error marking table {table_name} as written: {e}")
+
+
+async def is_table_recently_written(table_name: str) -> bool:
+    redis_instance = await RedisConnection.connect()
+    return bool(await redis_instance.exists(f"lance:written:{table_name}"))
+
+
+# Tables whose indexes have too many unindexed rows, optimized by table maintenance
+LANCE_OPTIMIZE_REQUESTS_KEY = "lance:optimize_requested"
+
+
+async def request_table_optimize(table_name: str) -> None:
+    redis_instance = await RedisConnection.connect()
+    await redis_instance.sadd(LANCE_OPTIMIZE_REQUESTS_KEY, table_name)
 
 
 async def add_record(table_name: str, records: list[TextEmbeddingSchema]):
+    """
+    table_name is the user_id, records go to the user's table or the shared table
+    depending on LANCE_STORAGE_LAYOUT.
+    """
     try:
-        table = await get_or_create_table(table_name)
+        physical_table_name, user_filter = resolve_user_table(table_name)
+        if user_filter is not None:
+            records = [
+                SharedTextEmbeddingSchema(**record.model_dump(), user_id=table_name)
+                for record in records
+            ]
+        await mark_table_written(physical_table_name)
+        table = await get_or_create_table(physical_table_name)
         await table.add(records)
     except Exception as e:
         print("Error in add_record: ")
@@ -51,34 +318,143 @@ async def add_record(table_name: str, records: list[TextEmbeddingSchema]):
         raise e
 
 
-async def delete_records_by_email_ref_id(table_name: str, email_ref_id: str) -> bool:
+def quote_sql_string(value: str) -> str:
     """
-    Deletes multiple records from the given table_name which has the given email_ref_id
+    Quote a value for a Lance filter expression, Lance has no bound parameters.
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+# Ids per IN predicate, keeps the filter expression a reasonable size
+LANCE_DELETE_BATCH_SIZE = 1000
+
+
+async def delete_records_by_email_ref_ids(
+    table_name: str, email_ref_ids: list[str], bodies_only: bool = False
+) -> bool:
+    """
+    Deletes the records of every given email_ref_id from the given table_name.
+    Uses one IN predicate per LANCE_DELETE_BATCH_SIZE ids, answered by the
+    email_ref_id scalar index once background_jobs/index_manager.py has built it.
+    bodies_only keeps the chunks of the emails' attachments.
+    Callers bump the KB version, cached answers may be based on the deleted emails.
     """
+    email_ref_ids = list(dict.fromkeys(str(email_ref_id) for email_ref_id in email_ref_ids))
+    if not email_ref_ids:
+        return True
     try:
-        table = await get_or_create_table(table_name)
-        await table.delete(where=f"email_ref_id = '{email_ref_id}'")
-        print(f"Deleted records with email_ref_id: {email_ref_id}")
+        physical_table_name, user_filter = resolve_user_table(table_name)
+        await mark_table_written(physical_table_name)
+        table = await get_or_create_table(physical_table_name)
+        for start in range(0, len(email_ref_ids), LANCE_DELETE_BATCH_SIZE):
+            batch = email_ref_ids[start : start + LANCE_DELETE_BATCH_SIZE]
+            ids = ", ".join(quote_sql_string(email_ref_id) for email_ref_id in batch)
+            where = f"email_ref_id IN ({ids})"
+            if bodies_only:
+                where += " AND attachment_name IS NULL"
+            await table.delete(where=_and_filter(user_filter, where))
+        print(f"Deleted records of {len(email_ref_ids)} email_ref_ids")
         return True
     except Exception as e:
-        print(f"Error deleting records by email_ref_id: {e}")
+        print(f"Error deleting records by email_ref_ids: {e}")
         return False
 
 
+async def delete_records_by_email_ref_id(table_name: str, email_ref_id: str) -> bool:
+    """
+    Deletes multiple records from the given table_name which has the given email_ref_id
+    """
+    return await delete_records_by_email_ref_ids(table_name, [email_ref_id])
+
+
+async def delete_attachment_records(
+    table_name: str, email_ref_id: str, attachment_name: str
+) -> None:
+    """
+    Deletes the chunks of one attachment, so a retried attachment job starts clean
+    """
+    physical_table_name, user_filter = resolve_user_table(table_name)
+    await mark_table_written(physical_table_name)
+    table = await get_or_create_table(physical_table_name)
+    await table.delete(
+        where=_and_filter(
+            user_filter,
+            f"email_ref_id = {quote_sql_string(email_ref_id)} "
+            f"AND attachment_name = {quote_sql_string(attachment_name)}",
+        )
+    )
+
+
+async def get_chunk_texts(table_name: str, email_ref_id: str) -> List[str]:
+    """
+    Texts of the stored chunks of one email, served by the email_ref_id scalar index
+    """
+    physical_table_name, user_filter = resolve_user_table(table_name)
+    table = await get_or_create_table(physical_table_name)
+    results = await (
+        table.query()
+        .where(_and_filter(user_filter, f"email_ref_id = {quote_sql_string(email_ref_id)}"))
+        .select(["text"])
+        .to_arrow()
+    )
+    return results.column("text").to_pylist()
+
+
 async def vector_search(
     table_name: str,
     query_vector: List[float],
     limit: int = 25,
+    nprobes: int = LANCE_SEARCH_NPROBES,
+    refine_factor: int = LANCE_SEARCH_REFINE_FACTOR,
+    with_vectors: bool = False,
 ) -> List[VectorSearchResult]:
+    """
+    nprobes and refine_factor only take effect when the table has an ANN index,
+    otherwise Lance does a flat scan.
+    On a shared table the user_id filter is applied before the search (prefilter),
+    so the user still gets up to `limit` of their own chunks.
+    """
     try:
-        table = await get_or_create_table(table_name)
-        results = (
-            await table.vector_search(query_vector)
-            .select(["email_ref_id", "chunk_sequence", "text", "created_at"])
+        physical_table_name, user_filter = resolve_user_table(table_name)
+        table = await get_or_create_table(physical_table_name)
+        query = (
+            table.vector_search(query_vector)
+            .select(search_columns(with_vectors))
             .limit(limit)
-            .to_pandas()
+            .nprobes(nprobes)
         )
-        return [VectorSearchResult(**row) for row in results.to_dict("records")]
+        if user_filter is not None:
+            query = query.where(user_filter)
+        if refine_factor > 0:
+            query = query.refine_factor(refine_factor)
+        return search_results_from_arrow(await query.to_arrow())
     except Exception as e:
         print(f"Error in vector_search: {e}")
         return []
+
+
+async def full_text_search(
+    table_name: str,
+    query_text: str,
+    limit: int = 25,
+    with_vectors: bool = False,
+) -> List[VectorSearchResult]:
+    """
+    BM25 keyword search over the text column.
+    Needs the FTS index built by background_jobs/index_manager.py, returns [] without it.
+    """
+    try:
+        physical_table_name, user_filter = resolve_user_table(table_name)
+        table = await get_or_create_table(physical_table_name)
+        query = (
+            table.query()
+            .nearest_to_text(query_text, columns="text")
+            .select(search_columns(with_vectors))
+            .limit(limit)
+        )
+        if user_filter is not None:
+            query = query.where(user_filter)
+        return search_results_from_arrow(await query.to_arrow())
+    except Exception as e:
+        print(f"Error in full_text_search: {e}")
+        return []
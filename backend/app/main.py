@@ -1,9 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 from contextlib import asynccontextmanager
 from app.routes import hello, postmark, auth, kb
 from app.database.database import Database
 from app.database.redis_connect import Redis
+from app.gemini.client import GeminiClient
+from app.lance_db import LanceConnection
+from app.helpers.metrics import run_metrics_flusher
+from app.helpers.postmark_client import PostmarkClient
 from app.config import settings
 
 
@@ -14,10 +19,23 @@ async def lifespan(app: FastAPI):
     await Database.connect()
     print("Connecting to Redis...")
     await Redis.connect()
+    print("Creating Gemini client...")
+    GeminiClient.connect()
+    print("Connecting to LanceDB...")
+    await LanceConnection.connect()
+    print("Starting Postmark client...")
+    await PostmarkClient.start()
+    metrics_task = asyncio.create_task(run_metrics_flusher())
     yield
+    # Flushes what is still buffered before Redis is disconnected
+    metrics_task.cancel()
+    await asyncio.gather(metrics_task, return_exceptions=True)
+    await PostmarkClient.stop()
     await Database.disconnect()
     await Redis.disconnect()
-    print("Disconnected from database and Redis")
+    await GeminiClient.disconnect()
+    await LanceConnection.disconnect()
+    print("Disconnected from Postmark, database, Redis, Gemini and LanceDB")
 
 
 # Initialize FastAPI app
@@ -41,7 +41,7 @@ async def signup(signup_data: SignupRequest):
     otp, is_new = await RedisConnection.generate_and_store_otp(signup_data.email)
 
     if is_new:
-        send_otp_email(signup_data.email, otp)
+        await send_otp_email(signup_data.email, otp)
 
     return {
         "message": "Signup request received. OTP sent.",
@@ -62,7 +62,7 @@ async def login(login_data: LoginRequest):
     otp, is_new = await RedisConnection.generate_and_store_otp(login_data.email)
 
     if is_new:
-        send_otp_email(login_data.email, otp)
+        await send_otp_email(login_data.email, otp)
 
     return {
         "message": "Login request received. OTP sent to your email",
@@ -1,6 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from app.lance_db import get_or_create_table
 from app.config import settings
+from app.helpers.metrics import get_metrics, get_local_metrics
 
 
 router = APIRouter()
@@ -25,6 +26,22 @@ async def get_environment():
     }
 
 
+@router.get("/metrics")
+async def metrics():
+    """
+    Cache hit/miss and other counters.
+    `total` is aggregated across all API and worker processes, `process` is this process only.
+
+    This route only works in development mode.
+    """
+    if settings.is_production:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return {
+        "total": await get_metrics(),
+        "process": get_local_metrics(),
+    }
+
+
 @router.get("/print-table/{table_id}")
 async def print_table_items(table_id: str):
     """
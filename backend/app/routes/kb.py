@@ -1,17 +1,34 @@
-from fastapi import APIRouter, Request, HTTPException
-from pydantic import BaseModel
+import json
+import time
+import uuid
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Request, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from app.helpers.jwt_helper import verify_jwt
 from app.database.database import Database
-from app.ai.qa_agent import qa_agent, AnswerOutputFormat
-from app.service.get_kb import get_kb
+from app.ai.qa_agent import qa_agent_stream
+from app.gemini.get_embeddings import get_query_embedding
+from app.service.get_kb import get_kb_with_sources
+from app.service.answer_question import answer_question
+from app.service.answer_cache import get_answer_cache_key, get_cached_answer, store_answer
+from app.service.email.delete import delete_emails
+from app.helpers.pagination_cursor import encode_cursor, decode_cursor
 
 router = APIRouter(prefix="/kb", tags=["kb"])
 
+KB_LIST_DEFAULT_LIMIT = 50
+KB_LIST_MAX_LIMIT = 200
+
 
 class QuestionRequest(BaseModel):
     question: str
 
 
+class DeleteEmailsRequest(BaseModel):
+    email_ids: list[uuid.UUID] = Field(min_length=1, max_length=1000)
+
+
 def validate_session_token(request: Request):
     """
     Helper function to validate session_token from request headers
@@ -51,10 +68,16 @@ def validate_session_token(request: Request):
 
 
 @router.get("/")
-async def get_kb_list(request: Request):
+async def get_kb_list(
+    request: Request,
+    limit: int = Query(KB_LIST_DEFAULT_LIMIT, ge=1, le=KB_LIST_MAX_LIMIT),
+    before: Optional[str] = None,
+):
     """
-    Get list of all emails for the authenticated user.
+    Get a page of emails for the authenticated user, newest first.
     Returns only id, subject, and created_at columns.
+    Pass next_cursor of the response as `before` to get the next page,
+    it is null on the last page.
     """
     # Validate session token
     payload = validate_session_token(request)
@@ -65,14 +88,36 @@ async def get_kb_list(request: Request):
         raise HTTPException(status_code=400, detail="user_id not found in token")
 
     try:
-        # Query emails table for the specific user
-        query = """
-            SELECT id, subject, created_at 
-            FROM emails 
-            WHERE user_id = $1 
-            ORDER BY created_at DESC
-        """
-        emails = await Database.fetch(query, user_id)
+        # Keyset pagination on idx_emails_user_id_created_at, one more row tells if there is a next page
+        if before:
+            try:
+                before_created_at, before_id = decode_cursor(before)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            query = """
+                SELECT id, subject, created_at
+                FROM emails
+                WHERE user_id = $1 AND (created_at, id) < ($2, $3)
+                ORDER BY created_at DESC, id DESC
+                LIMIT $4
+            """
+            emails = await Database.fetch(
+                query, user_id, before_created_at, before_id, limit + 1
+            )
+        else:
+            query = """
+                SELECT id, subject, created_at
+                FROM emails
+                WHERE user_id = $1
+                ORDER BY created_at DESC, id DESC
+                LIMIT $2
+            """
+            emails = await Database.fetch(query, user_id, limit + 1)
+
+        next_cursor = None
+        if len(emails) > limit:
+            emails = emails[:limit]
+            next_cursor = encode_cursor(emails[-1]["created_at"], emails[-1]["id"])
 
         # Convert records to list of dictionaries
         email_list = []
@@ -87,8 +132,10 @@ async def get_kb_list(request: Request):
                 }
             )
 
-        return {"emails": email_list}
+        return {"emails": email_list, "next_cursor": next_cursor}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -139,6 +186,54 @@ async def get_kb_by_id(request: Request, kb_id: str):
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
+@router.delete("/{kb_id}")
+async def delete_kb_by_id(request: Request, kb_id: uuid.UUID):
+    """
+    Delete a specific email and its vectors for the authenticated user.
+    """
+    # Validate session token
+    payload = validate_session_token(request)
+
+    # Get user_id from JWT payload
+    user_id = payload.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=400, detail="user_id not found in token")
+
+    try:
+        deleted_ids = await delete_emails(user_id, [str(kb_id)])
+        if not deleted_ids:
+            raise HTTPException(status_code=404, detail="Email not found")
+        return {"deleted_ids": deleted_ids}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Delete error: {str(e)}")
+
+
+@router.post("/delete")
+async def delete_kb_bulk(request: Request, delete_request: DeleteEmailsRequest):
+    """
+    Delete several emails and their vectors for the authenticated user.
+    Ids that don't exist or belong to another user are ignored.
+    """
+    # Validate session token
+    payload = validate_session_token(request)
+
+    # Get user_id from JWT payload
+    user_id = payload.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=400, detail="user_id not found in token")
+
+    try:
+        email_ids = [str(email_id) for email_id in delete_request.email_ids]
+        deleted_ids = await delete_emails(user_id, email_ids)
+        return {"deleted_ids": deleted_ids}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Delete error: {str(e)}")
+
+
 @router.post("/qa")
 async def qa_kb(request: Request, question_request: QuestionRequest):
     """
@@ -154,12 +249,79 @@ async def qa_kb(request: Request, question_request: QuestionRequest):
 
     try:
         question: str = question_request.question
-        knowledgebase: str = await get_kb(question, str(user_id))
-        answer: AnswerOutputFormat = await qa_agent(question, knowledgebase)
+        answer: str = await answer_question(question, str(user_id))
 
         return {
-            "answer": answer.answer,
+            "answer": answer,
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"QA processing error: {str(e)}")
+
+
+def format_sse(event: str, data: dict) -> str:
+    """
+    Format a Server-Sent Event, data is sent as JSON
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/qa/stream")
+async def qa_kb_stream(request: Request, question_request: QuestionRequest):
+    """
+    RAG based question answering streamed as Server-Sent Events.
+    Events:
+        sources: emails used to build the context, sent as soon as retrieval is done
+        token: a piece of the answer text
+        done: the answer is complete
+        error: something went wrong, the stream ends
+    """
+    # Validate session token
+    payload = validate_session_token(request)
+
+    # Get user_id from JWT payload
+    user_id = payload.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=400, detail="user_id not found in token")
+
+    question: str = question_request.question
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            started_at = time.perf_counter()
+            question_embedding: list[float] = await get_query_embedding(question)
+            cache_key = await get_answer_cache_key(str(user_id))
+            cached_answer = await get_cached_answer(cache_key, question_embedding)
+            if cached_answer is not None:
+                yield format_sse("sources", {"email_ids": [], "cached": True})
+                yield format_sse("token", {"text": cached_answer})
+                yield format_sse("done", {})
+                return
+
+            knowledgebase, search_results = await get_kb_with_sources(
+                question, str(user_id)
+            )
+            email_ids: list[str] = list(
+                dict.fromkeys(result.email_ref_id for result in search_results)
+            )
+            yield format_sse("sources", {"email_ids": email_ids})
+
+            answer_parts: list[str] = []
+            async for text in qa_agent_stream(question, knowledgebase):
+                answer_parts.append(text)
+                yield format_sse("token", {"text": text})
+            yield format_sse("done", {})
+
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+            await store_answer(
+                cache_key, question_embedding, question, "".join(answer_parts), elapsed_ms
+            )
+        except Exception as e:
+            print(f"Error in qa stream: {e}")
+            yield format_sse("error", {"detail": f"QA processing error: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,111 +1,45 @@
-from fastapi import APIRouter, Request, BackgroundTasks, HTTPException
-import json
-from app.service.email.create import create_email
-from app.service.get_user_by_email import get_user_by_email
-from app.ai.classify_email import classify_email, OutputFormat
+from fastapi import APIRouter, HTTPException, Request
 from typing import Any
-from app.helpers.remove_links import remove_links
-from app.background_jobs.email_processor import add_email_processing_task
-from app.ai.qa_agent import qa_agent, AnswerOutputFormat
-from app.ai.extract_username_agent import (
-    extract_username_agent,
-    OutputFormatExtractName,
+from app.background_jobs.inbound_pipeline import (
+    validate_postmark_payload,
+    enqueue_inbound_email,
 )
-from app.service.get_kb import get_kb
-from app.helpers.sendemail import sendemail
-from app.helpers.generate_qa_email_html import generate_qa_email_html
-from app.helpers.send_welcome_email import send_welcome_email
-
-from app.service.create_user import create_user_service
 
 
 router: APIRouter = APIRouter()
 
 
 @router.post("/postmark")
-async def handle_postmark_webhook(
-    request: Request, background_tasks: BackgroundTasks
-) -> Any:
-    """Handle inbound email webhooks from Postmark"""
+async def handle_postmark_webhook(request: Request) -> Any:
+    """
+    Handle inbound email webhooks from Postmark.
+    Only validates and queues the payload, classification, QA and replies
+    run in the worker process (see background_jobs/inbound_pipeline.py).
+    """
     try:
 
         json_data: Any = await request.json()
 
         print("=== Postmark Inbound Email Data ===")
-        print(json.dumps(json_data, indent=2))
+        print(f"From: {json_data.get('From', None)}")
+        print(f"Subject: {json_data.get('Subject', None)}")
         print("=== End Postmark Data ===")
 
-        sender_email = json_data.get("From", None)
-        if not sender_email:
-            raise ValueError("Sender email not found")
-
-        email_subject = json_data.get("Subject", None)
-        if not email_subject:
-            raise ValueError("Subject not found")
-
-        text_body = json_data.get("TextBody", None)
-        if not text_body:
-            raise ValueError("Text body not found")
-
-        html_body = json_data.get("HtmlBody", None)
-
-        user_data = await get_user_by_email(sender_email)
-
-        if not user_data:
-            print(f"New user detected: {sender_email}")
-            text_body_without_links: str = remove_links(text_body)
-            text_first_500_chars: str = text_body_without_links[:500]
-            extracted_name: OutputFormatExtractName = await extract_username_agent(
-                text_first_500_chars
-            )
-            username: str = (
-                extracted_name.username if extracted_name.username else sender_email
-            )
-            await create_user_service(sender_email, username)
-            send_welcome_email(sender_email, username)
-            return {"message": "Welcome email sent to new user"}
-
-        user_id = user_data["id"]
-
-        text_body_without_links: str = remove_links(text_body)
-
-        text_first_500_chars: str = text_body_without_links[:500]
-
-        classify_answer: OutputFormat = await classify_email(text_first_500_chars)
-
-        if classify_answer.action == "SAVE":
-            email_ref_id = await create_email(
-                user_id, email_subject, text_body, html_body, is_forwarded=False
-            )
-
-            add_email_processing_task(
-                background_tasks,
-                user_id,
-                email_ref_id,
-                str(email_subject),
-                str(text_body_without_links),
-            )
-            print("Background task started for subject: ", email_subject)
-            return {"message": "Okay"}
-        elif classify_answer.action == "QA":
-            question: str = text_body
-            user_name: str = user_data["name"]
-            knowledgebase: str = await get_kb(question, str(user_id))
-            extended_knowledgebase: str = (
-                f"{knowledgebase}\nremember user name is {user_name}"
-            )
-            answer: AnswerOutputFormat = await qa_agent(
-                text_body, extended_knowledgebase
-            )
-            answer_html: str = generate_qa_email_html(question, answer.answer)
-            truncated_question = question[:50] + ("..." if len(question) > 50 else "")
-            answer_email_subject: str = f"InboxMemory AI Answer: {truncated_question}"
-            sendemail(sender_email, answer_email_subject, answer_html)
-            return {"message": "Okay"}
-
-        raise HTTPException(status_code=500, detail="Something went wrong")
+        validate_postmark_payload(json_data)
 
     except Exception as e:
+        # Postmark would retry an invalid payload forever, acknowledge it
         print(f"Error processing Postmark webhook")
         print(e)
         return {"status": "error", "message": "Failed to process email"}
+
+    try:
+        message_id = await enqueue_inbound_email(json_data)
+    except Exception as e:
+        print(f"Error queueing Postmark webhook: {e}")
+        # A non 2xx response makes Postmark retry the webhook later
+        raise HTTPException(status_code=503, detail="Failed to queue email")
+    if message_id is None:
+        print("Duplicate Postmark webhook ignored")
+
+    return {"message": "Okay"}
@@ -0,0 +1,134 @@
+import json
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Optional, cast
+import numpy as np
+from app.database.redis_connect import RedisConnection
+from app.gemini.embedding_cache import pack_vector
+from app.gemini.get_embeddings import GEMINI_EMBEDDING_DIMENSIONS
+from app.helpers.metrics import incr_metric
+
+
+# A cached answer is reused when the new question is within this cosine distance
+ANSWER_CACHE_MAX_DISTANCE = float(os.getenv("ANSWER_CACHE_MAX_DISTANCE", "0.08"))
+# Most recent answers kept per user, knowledge base version and day
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "100"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+ANSWER_CACHE_METRIC = "answer_cache"
+
+# Each entry is the packed float32 question vector followed by JSON metadata
+_VECTOR_BYTES = GEMINI_EMBEDDING_DIMENSIONS * 4
+
+
+def _kb_version_key(user_id: str) -> str:
+    return f"kb:version:{user_id}"
+
+
+def _answer_cache_key(user_id: str, kb_version: int, day: date) -> str:
+    return f"qa_cache:{user_id}:{kb_version}:{day.isoformat()}"
+
+
+async def get_kb_version(user_id: str) -> int:
+    redis_instance = await RedisConnection.connect()
+    version = await redis_instance.get(_kb_version_key(str(user_id)))
+    return int(version) if version else 0
+
+
+async def get_answer_cache_key(user_id: str) -> Optional[str]:
+    """
+    Cache key for a question asked now, call before retrieval and pass it to both
+    get_cached_answer and store_answer. An answer built while the KB changed is then stored
+    under the old version and never served as fresh.
+    qa_agent tells the model today's date, answers to "what is due tomorrow" only hold for
+    the day they were generated on.
+    Returns:
+        None if Redis can't be reached, the cache is skipped
+    """
+    try:
+        kb_version = await get_kb_version(user_id)
+        return _answer_cache_key(str(user_id), kb_version, datetime.now().date())
+    except Exception as e:
+        print(f"Error reading kb version for user {user_id}: {e}")
+        return None
+
+
+def _seconds_until_tomorrow() -> int:
+    now = datetime.now()
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), time.min)
+    return max(1, int((tomorrow - now).total_seconds()))
+
+
+async def bump_kb_version(user_id: str) -> None:
+    """
+    Call whenever the user's LanceDB table changes, cached answers of the old version are never read again.
+    """
+    try:
+        redis_instance = await RedisConnection.connect()
+        await redis_instance.incr(_kb_version_key(str(user_id)))
+    except Exception as e:
+        print(f"Error bumping kb version for user {user_id}: {e}")
+
+
+async def get_cached_answer(
+    cache_key: Optional[str], question_embedding: list[float]
+) -> Optional[str]:
+    """
+    Return the answer of the closest cached question if it is within ANSWER_CACHE_MAX_DISTANCE.
+    cache_key comes from get_answer_cache_key.
+    """
+    if cache_key is None:
+        return None
+    try:
+        redis_instance = await RedisConnection.connect_binary()
+        entries = cast(list[bytes], await redis_instance.lrange(cache_key, 0, -1))
+        if not entries:
+            await incr_metric(ANSWER_CACHE_METRIC, "misses")
+            return None
+
+        cached_vectors = np.frombuffer(
+            b"".join(entry[:_VECTOR_BYTES] for entry in entries), dtype=np.float32
+        ).reshape(len(entries), GEMINI_EMBEDDING_DIMENSIONS)
+        query = np.asarray(question_embedding, dtype=np.float32)
+        similarities = cached_vectors @ query / (
+            np.linalg.norm(cached_vectors, axis=1) * np.linalg.norm(query) + 1e-10
+        )
+        best = int(np.argmax(similarities))
+        if 1 - similarities[best] > ANSWER_CACHE_MAX_DISTANCE:
+            await incr_metric(ANSWER_CACHE_METRIC, "misses")
+            return None
+
+        metadata = json.loads(entries[best][_VECTOR_BYTES:].decode("utf-8"))
+        await incr_metric(ANSWER_CACHE_METRIC, "hits")
+        await incr_metric(ANSWER_CACHE_METRIC, "saved_ms", metadata.get("elapsed_ms", 0.0))
+        return metadata["answer"]
+    except Exception as e:
+        print(f"Error reading answer cache: {e}")
+        return None
+
+
+async def store_answer(
+    cache_key: Optional[str],
+    question_embedding: list[float],
+    question: str,
+    answer: str,
+    elapsed_ms: float,
+) -> None:
+    """
+    Cache an answer under the key read before its retrieval (see get_answer_cache_key).
+    Entries expire at the end of the day at the latest.
+    elapsed_ms is how long retrieval and generation took, reported as saved latency on hits.
+    """
+    if cache_key is None:
+        return
+    try:
+        entry = pack_vector(question_embedding) + json.dumps(
+            {"question": question, "answer": answer, "elapsed_ms": elapsed_ms}
+        ).encode("utf-8")
+        redis_instance = await RedisConnection.connect_binary()
+        async with redis_instance.pipeline(transaction=False) as pipe:
+            pipe.lpush(cache_key, entry)
+            pipe.ltrim(cache_key, 0, ANSWER_CACHE_MAX_ENTRIES - 1)
+            pipe.expire(cache_key, min(ANSWER_CACHE_TTL_SECONDS, _seconds_until_tomorrow()))
+            await pipe.execute()
+    except Exception as e:
+        print(f"Error writing answer cache: {e}")
@@ -0,0 +1,34 @@
+import time
+from app.ai.qa_agent import qa_agent, AnswerOutputFormat
+from app.gemini.get_embeddings import get_query_embedding
+from app.service.get_kb import get_kb
+from app.service.answer_cache import get_answer_cache_key, get_cached_answer, store_answer
+
+
+async def answer_question(question: str, user_id: str, user_name: str | None = None) -> str:
+    """
+    Answer a question from the user's knowledge base.
+    Semantically similar questions asked against the same knowledge base version are
+    answered from the answer cache without retrieval or generation.
+    Args:
+        question: The user's question
+        user_id: The user's ID
+        user_name: Optional name passed to the model so it can address the user
+    Returns:
+        The answer text
+    """
+    started_at = time.perf_counter()
+    question_embedding: list[float] = await get_query_embedding(question)
+    cache_key = await get_answer_cache_key(user_id)
+    cached_answer = await get_cached_answer(cache_key, question_embedding)
+    if cached_answer is not None:
+        return cached_answer
+
+    knowledgebase: str = await get_kb(question, user_id)
+    if user_name:
+        knowledgebase = f"{knowledgebase}\nremember user name is {user_name}"
+    answer: AnswerOutputFormat = await qa_agent(question, knowledgebase)
+
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    await store_answer(cache_key, question_embedding, question, answer.answer, elapsed_ms)
+    return answer.answer
@@ -0,0 +1,140 @@
+import math
+import os
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel
+from app.database.database import Database
+from app.lance_db import VectorSearchResult
+
+
+# Rough size of the context sent to qa_agent, in tokens
+KB_CONTEXT_TOKEN_BUDGET = int(os.getenv("KB_CONTEXT_TOKEN_BUDGET", "2000"))
+# Groups that would be cut below this many tokens are dropped instead
+KB_CONTEXT_MIN_GROUP_TOKENS = 50
+# split_text_recursive overlaps chunks by up to 100 characters, look a bit further
+MAX_CHUNK_OVERLAP_CHARS = 300
+MIN_CHUNK_OVERLAP_CHARS = 10
+
+
+class EmailMetadata(BaseModel):
+    subject: Optional[str]
+    created_at: Optional[datetime]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    About 4 characters per token for English text, close enough for budgeting
+    """
+    return math.ceil(len(text) / 4)
+
+
+def merge_overlapping(previous: str, following: str) -> str:
+    """
+    Join two consecutive chunks of one email, dropping the text they share.
+    """
+    max_overlap = min(len(previous), len(following), MAX_CHUNK_OVERLAP_CHARS)
+    for size in range(max_overlap, MIN_CHUNK_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(following[:size]):
+            return previous + following[size:]
+    return f"{previous}\n{following}"
+
+
+def merge_email_chunks(chunks: list[VectorSearchResult]) -> str:
+    """
+    Chunks of one email body or attachment in reading order, adjacent chunks are merged and gaps marked with "..."
+    """
+    ordered = sorted(chunks, key=lambda chunk: chunk.chunk_sequence)
+    text = ordered[0].text
+    for previous, chunk in zip(ordered, ordered[1:]):
+        if chunk.chunk_sequence == previous.chunk_sequence:
+            continue
+        if chunk.chunk_sequence == previous.chunk_sequence + 1:
+            text = merge_overlapping(text, chunk.text)
+        else:
+            text = f"{text}\n...\n{chunk.text}"
+    return text
+
+
+def format_email_header(
+    metadata: Optional[EmailMetadata],
+    fallback_date: datetime,
+    attachment_name: Optional[str] = None,
+) -> str:
+    subject = metadata.subject if metadata and metadata.subject else "No subject"
+    created_at = metadata.created_at if metadata and metadata.created_at else fallback_date
+    header = f"Email: {subject} (saved {created_at.date().isoformat()})"
+    if attachment_name:
+        header += f", attachment {attachment_name}"
+    return header
+
+
+def build_context(
+    results: list[VectorSearchResult],
+    email_metadata: dict[str, EmailMetadata],
+    token_budget: int = KB_CONTEXT_TOKEN_BUDGET,
+) -> tuple[str, list[VectorSearchResult]]:
+    """
+    Group ranked search results by email and pack them into the token budget.
+    Emails are ordered by their best ranked chunk, each one is prefixed with its subject and date.
+    Each attachment of an email is its own group.
+    Args:
+        results: Search results, best first
+        email_metadata: Subject and date by email_ref_id, missing emails get a generic header
+        token_budget: Max estimated tokens of the returned context
+    Returns:
+        (context, the results that made it into the context)
+    """
+    groups: dict[tuple[str, Optional[str]], list[VectorSearchResult]] = {}
+    for result in results:
+        groups.setdefault((result.email_ref_id, result.attachment_name), []).append(result)
+
+    sections: list[str] = []
+    used: list[VectorSearchResult] = []
+    remaining = token_budget
+    for (email_ref_id, attachment_name), chunks in groups.items():
+        section = (
+            format_email_header(
+                email_metadata.get(email_ref_id), chunks[0].created_at, attachment_name
+            )
+            + "\n"
+            + merge_email_chunks(chunks)
+        )
+        tokens = estimate_tokens(section)
+        if tokens > remaining:
+            if remaining < KB_CONTEXT_MIN_GROUP_TOKENS:
+                break
+            section = section[: remaining * 4]
+            tokens = remaining
+        sections.append(section)
+        used.extend(chunks)
+        remaining -= tokens
+
+    return "\n\n".join(sections), used
+
+
+async def get_email_metadata(
+    user_id: str, email_ref_ids: list[str]
+) -> dict[str, EmailMetadata]:
+    """
+    Subjects and dates of the given emails, an empty dict if Postgres can't be reached
+    so answering still works.
+    """
+    if not email_ref_ids:
+        return {}
+    try:
+        rows = await Database.fetch(
+            """
+            SELECT id, subject, created_at
+            FROM emails
+            WHERE user_id = $1 AND id = ANY($2::uuid[])
+            """,
+            user_id,
+            email_ref_ids,
+        )
+        return {
+            str(row["id"]): EmailMetadata(subject=row["subject"], created_at=row["created_at"])
+            for row in rows
+        }
+    except Exception as e:
+        print(f"Error fetching email metadata: {e}")
+        return {}
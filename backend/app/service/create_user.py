@@ -1,6 +1,7 @@
 from typing import Optional
 import asyncpg
 from app.database.database import Database
+from app.service.user_cache import UserCache
 
 
 class UserCreationError(Exception):
@@ -49,5 +50,6 @@ async def create_user_service(email: str, name: str) -> asyncpg.Record:
     
     if not created_user:
         raise UserCreationError("Failed to create user")
-    
+
+    await UserCache.invalidate(email)
     return created_user
@@ -0,0 +1,130 @@
+import os
+from typing import Any, Optional
+from uuid import UUID
+from pydantic import BaseModel
+from app.background_jobs.email_queue import enqueue_attachment_processing_task
+from app.helpers.attachment_text import document_filetype
+from app.helpers.metrics import incr_metric
+from app.helpers.process_pool import ProcessPool
+
+
+ATTACHMENT_INGESTION_ENABLED = (
+    os.getenv("ATTACHMENT_INGESTION_ENABLED", "true").lower() == "true"
+)
+# Larger attachments are dropped before the webhook payload is queued
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(20 * 1024 * 1024)))
+# Pages after this one are not indexed
+ATTACHMENT_MAX_PAGES = int(os.getenv("ATTACHMENT_MAX_PAGES", "300"))
+# Pages extracted per process pool call, bounds the text held in memory at once
+ATTACHMENT_PAGE_BATCH = int(os.getenv("ATTACHMENT_PAGE_BATCH", "10"))
+# A pool call (page count, one page batch) taking longer is given up, the document is skipped
+ATTACHMENT_EXTRACT_TIMEOUT_SECONDS = float(
+    os.getenv("ATTACHMENT_EXTRACT_TIMEOUT_SECONDS", "60")
+)
+ATTACHMENT_PROCESSES = int(os.getenv("ATTACHMENT_PROCESSES", "1"))
+ATTACHMENT_METRIC = "attachments"
+
+# Document parsing gets its own pool, a crashing or hanging document can't take
+# email text preparation down with it
+AttachmentPool = ProcessPool("Attachment", ATTACHMENT_PROCESSES)
+
+
+class DocumentAttachment(BaseModel):
+    name: str
+    content_type: Optional[str]
+    filetype: str
+    # Base64, as sent by Postmark
+    content: str
+
+
+def decoded_size(content: str) -> int:
+    return len(content) * 3 // 4 - content[-2:].count("=")
+
+
+def _unique_name(name: str, taken: set[str]) -> str:
+    """Chunks are stored by attachment name, two "invoice.pdf" in one email must not mix"""
+    unique, counter = name, 2
+    while unique in taken:
+        root, extension = os.path.splitext(name)
+        unique = f"{root} ({counter}){extension}"
+        counter += 1
+    taken.add(unique)
+    return unique
+
+
+def select_document_attachments(
+    json_data: dict[str, Any],
+) -> tuple[list[DocumentAttachment], int]:
+    """
+    Supported document attachments of a Postmark payload within ATTACHMENT_MAX_BYTES.
+    Returns:
+        (attachments to ingest, number of documents skipped for their size)
+    """
+    if not ATTACHMENT_INGESTION_ENABLED:
+        return [], 0
+    selected: list[DocumentAttachment] = []
+    too_large = 0
+    taken: set[str] = set()
+    for attachment in json_data.get("Attachments", None) or []:
+        if not isinstance(attachment, dict) or not attachment.get("Content", None):
+            continue
+        name = attachment.get("Name", None) or "attachment"
+        filetype = document_filetype(name, attachment.get("ContentType", None))
+        if filetype is None:
+            continue
+        if decoded_size(attachment["Content"]) > ATTACHMENT_MAX_BYTES:
+            print(f"Attachment {name} is larger than {ATTACHMENT_MAX_BYTES} bytes, skipping")
+            too_large += 1
+            continue
+        selected.append(
+            DocumentAttachment(
+                name=_unique_name(name, taken),
+                content_type=attachment.get("ContentType", None),
+                filetype=filetype,
+                content=attachment["Content"],
+            )
+        )
+    return selected, too_large
+
+
+async def strip_unused_attachments(json_data: dict[str, Any]) -> dict[str, Any]:
+    """
+    Drop the attachments that won't be ingested so they don't sit in the inbound stream
+    """
+    if not json_data.get("Attachments", None):
+        return json_data
+    attachments, too_large = select_document_attachments(json_data)
+    if too_large:
+        await incr_metric(ATTACHMENT_METRIC, "too_large", too_large)
+    return {
+        **json_data,
+        "Attachments": [
+            {
+                "Name": attachment.name,
+                "ContentType": attachment.content_type,
+                "Content": attachment.content,
+            }
+            for attachment in attachments
+        ],
+    }
+
+
+async def enqueue_document_attachments(
+    user_id: UUID | str, email_ref_id: str, email_subject: str, json_data: dict[str, Any]
+) -> int:
+    """
+    Queue every document attachment of a saved email for extraction and embedding.
+    Returns:
+        Number of attachments queued
+    """
+    attachments, _ = select_document_attachments(json_data)
+    for attachment in attachments:
+        await enqueue_attachment_processing_task(
+            user_id,
+            email_ref_id,
+            email_subject,
+            attachment.name,
+            attachment.filetype,
+            attachment.content,
+        )
+    return len(attachments)
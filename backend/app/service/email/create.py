@@ -1,4 +1,5 @@
 from typing import Optional
+import asyncpg
 from app.database.database import Database
 
 
@@ -14,20 +15,22 @@ async def create_email(
     content_text: str,
     content_html: Optional[str],
     is_forwarded: bool = False,
+    postmark_message_id: Optional[str] = None,
 ) -> str:
+    """
+    Returns:
+        The email id, the existing one if an email with this postmark_message_id was
+        already saved (a retried inbound job)
+    """
     try:
-        # Check if user exists
-        existing_user = await Database.fetchrow(
-            "SELECT id FROM users WHERE id = $1", user_id
-        )
-
-        if not existing_user:
-            raise UserNotFoundError("User with this ID does not exist")
-
+        # The user_id foreign key rejects unknown users, no need for a lookup first
         new_email = await Database.execute_and_return(
             """
-            INSERT INTO emails (user_id, subject, content_html, content_text, is_forwarded)
-            VALUES ($1, $2, $3, $4, $5)
+            INSERT INTO emails (
+                user_id, subject, content_html, content_text, is_forwarded, postmark_message_id
+            )
+            VALUES ($1, $2, $3, $4, $5, $6)
+            ON CONFLICT (postmark_message_id) DO NOTHING
             RETURNING id
             """,
             user_id,
@@ -35,12 +38,20 @@ async def create_email(
             content_html,
             content_text,
             is_forwarded,
+            postmark_message_id,
         )
+        if new_email is None and postmark_message_id:
+            new_email = await Database.fetchrow(
+                "SELECT id FROM emails WHERE postmark_message_id = $1", postmark_message_id
+            )
 
         if new_email and new_email["id"]:
             return str(new_email["id"])
         else:
             raise Exception("Failed to create email with id")
+    except asyncpg.ForeignKeyViolationError:
+        print(f"Failed to create email: user {user_id} does not exist")
+        raise UserNotFoundError("User with this ID does not exist")
     except Exception as e:
         print(f"Failed to create email: {e}")
         raise e
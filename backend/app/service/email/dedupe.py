@@ -0,0 +1,143 @@
+import os
+from typing import Optional, cast
+import numpy as np
+from pydantic import BaseModel
+from redis.typing import EncodableT, FieldT
+from app.database.redis_connect import RedisConnection
+from app.helpers.metrics import incr_metric
+from app.helpers.minhash import minhash_signature, signature_similarity, lsh_band_keys
+from app.helpers.text_preparation import (
+    TextPreparationPool,
+    TEXT_PREP_PROCESS_THRESHOLD_CHARS,
+)
+
+
+DEDUPE_ENABLED = os.getenv("DEDUPE_ENABLED", "true").lower() == "true"
+# At or above this estimated similarity a new email is linked to the stored one, nothing is embedded
+DEDUPE_SKIP_SIMILARITY = float(os.getenv("DEDUPE_SKIP_SIMILARITY", "0.9"))
+# At or above this only the chunks the stored email doesn't have are embedded
+DEDUPE_PARTIAL_SIMILARITY = float(os.getenv("DEDUPE_PARTIAL_SIMILARITY", "0.5"))
+DEDUPE_METRIC = "dedupe"
+
+
+class NearDuplicate(BaseModel):
+    email_ref_id: str
+    similarity: float
+
+
+def _signatures_key(user_id: str) -> str:
+    return f"dedupe:{user_id}:signatures"
+
+
+def _bands_key(user_id: str) -> str:
+    return f"dedupe:{user_id}:bands"
+
+
+def _links_key(user_id: str) -> str:
+    return f"dedupe:{user_id}:links"
+
+
+async def compute_signature(text: str) -> np.ndarray:
+    """
+    MinHash signature, in the process pool for large texts
+    """
+    if len(text) <= TEXT_PREP_PROCESS_THRESHOLD_CHARS:
+        return minhash_signature(text)
+    return await TextPreparationPool.run(minhash_signature, text)
+
+
+async def find_near_duplicate(
+    user_id: str, email_ref_id: str, signature: np.ndarray
+) -> Optional[NearDuplicate]:
+    """
+    Most similar other stored email of the user sharing an LSH band with the signature,
+    None below DEDUPE_PARTIAL_SIMILARITY. The email itself is stored already when its job
+    runs again.
+    """
+    try:
+        redis_instance = await RedisConnection.connect_binary()
+        candidates = cast(
+            list[Optional[bytes]],
+            await redis_instance.hmget(_bands_key(user_id), lsh_band_keys(signature)),
+        )
+        candidate_ids = list(
+            {candidate.decode("utf-8") for candidate in candidates if candidate} - {email_ref_id}
+        )
+        if not candidate_ids:
+            return None
+        stored = cast(
+            list[Optional[bytes]],
+            await redis_instance.hmget(_signatures_key(user_id), candidate_ids),
+        )
+    except Exception as e:
+        print(f"Error reading dedupe index: {e}")
+        return None
+
+    best: Optional[NearDuplicate] = None
+    for candidate_id, stored_signature in zip(candidate_ids, stored):
+        # Signatures of deleted emails are gone, their band entries are left behind
+        if not stored_signature:
+            continue
+        similarity = signature_similarity(
+            signature, np.frombuffer(stored_signature, dtype=np.uint32)
+        )
+        if best is None or similarity > best.similarity:
+            best = NearDuplicate(email_ref_id=candidate_id, similarity=similarity)
+    if best is None or best.similarity < DEDUPE_PARTIAL_SIMILARITY:
+        return None
+    return best
+
+
+async def store_signature(user_id: str, email_ref_id: str, signature: np.ndarray) -> None:
+    """
+    Add an embedded email to the user's dedupe index, newer emails take over shared band buckets
+    """
+    try:
+        band_entries: dict[FieldT, EncodableT] = {
+            band_key: email_ref_id for band_key in lsh_band_keys(signature)
+        }
+        redis_instance = await RedisConnection.connect_binary()
+        async with redis_instance.pipeline(transaction=False) as pipe:
+            pipe.hset(_signatures_key(user_id), email_ref_id, signature.astype(np.uint32).tobytes())
+            pipe.hset(_bands_key(user_id), mapping=band_entries)
+            await pipe.execute()
+    except Exception as e:
+        print(f"Error writing dedupe index: {e}")
+
+
+async def link_duplicate(user_id: str, email_ref_id: str, duplicate: NearDuplicate) -> None:
+    """
+    Remember that some or all of an email's content is only embedded under duplicate.email_ref_id
+    """
+    try:
+        redis_instance = await RedisConnection.connect()
+        await redis_instance.hset(_links_key(user_id), email_ref_id, duplicate.email_ref_id)
+    except Exception as e:
+        print(f"Error linking duplicate email: {e}")
+
+
+async def forget_emails(user_id: str, email_ref_ids: list[str]) -> list[str]:
+    """
+    Call when emails are deleted so new copies of them are embedded again.
+    Returns:
+        Emails linked to a deleted one, they must be embedded again in full
+    """
+    if not email_ref_ids:
+        return []
+    try:
+        redis_instance = await RedisConnection.connect()
+        links = cast(dict[str, str], await redis_instance.hgetall(_links_key(user_id)))
+        deleted = set(email_ref_ids)
+        orphaned = [
+            email_ref_id
+            for email_ref_id, original_id in links.items()
+            if original_id in deleted and email_ref_id not in deleted
+        ]
+        async with redis_instance.pipeline(transaction=False) as pipe:
+            pipe.hdel(_signatures_key(user_id), *email_ref_ids)
+            pipe.hdel(_links_key(user_id), *email_ref_ids, *orphaned)
+            await pipe.execute()
+        return orphaned
+    except Exception as e:
+        print(f"Error removing emails from dedupe index: {e}")
+        return []
@@ -0,0 +1,77 @@
+from app.background_jobs.email_queue import enqueue_email_processing_task
+from app.database.database import Database
+from app.helpers.email_normalization import paragraph_fingerprints
+from app.helpers.text_preparation import remove_links_async
+from app.lance_db import delete_records_by_email_ref_ids
+from app.service.answer_cache import bump_kb_version
+from app.service.email.dedupe import forget_emails
+from app.service.email.normalize import forget_paragraphs, normalize_email_body
+
+
+async def delete_emails(user_id: str, email_ids: list[str]) -> list[str]:
+    """
+    Delete the user's emails from Postgres together with their vectors in LanceDB.
+    The Postgres delete is rolled back if the vectors could not be deleted,
+    so the email stays visible and the delete can be retried.
+    Returns:
+        Ids of the deleted emails, ids that are not the user's are ignored
+    """
+    async with Database.transaction() as connection:
+        rows = await connection.fetch(
+            """
+            DELETE FROM emails WHERE user_id = $1 AND id = ANY($2::uuid[])
+            RETURNING id
+            """,
+            user_id,
+            email_ids,
+        )
+        deleted_ids = [str(row["id"]) for row in rows]
+        if deleted_ids and not await delete_records_by_email_ref_ids(
+            str(user_id), deleted_ids
+        ):
+            raise Exception("Failed to delete email vectors")
+    if deleted_ids:
+        # Cached answers may be based on the deleted emails
+        await bump_kb_version(str(user_id))
+    await forget_paragraphs(str(user_id), deleted_ids)
+    orphaned = await forget_emails(str(user_id), deleted_ids)
+    if orphaned:
+        await reembed_emails(str(user_id), orphaned)
+    return deleted_ids
+
+
+async def reembed_emails(user_id: str, email_ids: list[str]) -> None:
+    """
+    Queue emails to be embedded again in full, for near-duplicates whose
+    original was deleted and which only had their own new chunks embedded
+    """
+    # Their attachments were embedded on their own and stay as they are
+    if not await delete_records_by_email_ref_ids(user_id, email_ids, bodies_only=True):
+        print(f"Failed to delete vectors of emails to re-embed: {email_ids}")
+        return
+    await bump_kb_version(user_id)
+    # Otherwise their own quoted history counts as already stored and is filtered out,
+    # the jobs record the fingerprints again once the chunks are written
+    await forget_paragraphs(user_id, email_ids)
+    rows = await Database.fetch(
+        """
+        SELECT id, subject, content_text, content_html FROM emails
+        WHERE user_id = $1 AND id = ANY($2::uuid[])
+        """,
+        user_id,
+        email_ids,
+    )
+    for row in rows:
+        normalized = await normalize_email_body(
+            user_id, row["content_text"], row["content_html"]
+        )
+        if not normalized.text:
+            continue
+        await enqueue_email_processing_task(
+            user_id,
+            str(row["id"]),
+            str(row["subject"]),
+            await remove_links_async(normalized.text),
+            paragraph_fingerprints(normalized.text),
+        )
+        print(f"Queued email {row['id']} to be embedded again")
@@ -0,0 +1,182 @@
+import math
+import os
+from typing import Optional
+from pydantic import BaseModel
+from app.database.redis_connect import RedisConnection
+from app.helpers.email_normalization import (
+    EmailParts,
+    paragraph_fingerprint,
+    prepare_email_parts,
+    split_paragraphs,
+)
+from app.helpers.metrics import incr_metric
+from app.helpers.text_preparation import (
+    TextPreparationPool,
+    TEXT_PREP_PROCESS_THRESHOLD_CHARS,
+)
+
+
+# A history block is dropped entirely once this share of its paragraphs is already stored
+STORED_HISTORY_RATIO = float(os.getenv("NORMALIZE_STORED_HISTORY_RATIO", "0.8"))
+NORMALIZATION_METRIC = "normalization"
+# Must match split_text_recursive, only used to estimate the chunks saved
+_CHUNK_STRIDE_CHARS = 1100 - 100
+
+
+class NormalizationReport(BaseModel):
+    text: str
+    source: str
+    chars_removed: int
+    chunks_removed: int
+    history_blocks_removed: int
+
+
+# Fingerprints are counted per user over the embedded emails containing them, each
+# email's own set records what it added so deleting it removes exactly that
+_REMEMBER_SCRIPT = """
+local added = 0
+for _, fingerprint in ipairs(ARGV) do
+    if redis.call("sadd", KEYS[1], fingerprint) == 1 then
+        redis.call("hincrby", KEYS[2], fingerprint, 1)
+        added = added + 1
+    end
+end
+return added
+"""
+
+_FORGET_SCRIPT = """
+local fingerprints = redis.call("smembers", KEYS[1])
+for _, fingerprint in ipairs(fingerprints) do
+    if redis.call("hincrby", KEYS[2], fingerprint, -1) <= 0 then
+        redis.call("hdel", KEYS[2], fingerprint)
+    end
+end
+redis.call("del", KEYS[1])
+return #fingerprints
+"""
+
+
+def _fingerprint_counts_key(user_id: str) -> str:
+    return f"kb:paragraph_counts:{user_id}"
+
+
+def _email_fingerprints_key(user_id: str, email_ref_id: str) -> str:
+    return f"kb:paragraphs:{user_id}:{email_ref_id}"
+
+
+def estimate_chunks(chars: int) -> int:
+    return math.ceil(chars / _CHUNK_STRIDE_CHARS) if chars else 0
+
+
+async def _filter_stored_history(user_id: str, history: list[str]) -> tuple[list[str], int]:
+    """
+    Keep only history the user hasn't saved before, forwarded mail is often new knowledge.
+    Returns:
+        (kept blocks, number of blocks dropped)
+    """
+    blocks = [
+        [(paragraph, paragraph_fingerprint(paragraph)) for paragraph in split_paragraphs(block)]
+        for block in history
+    ]
+    fingerprints = list(
+        {fingerprint for block in blocks for _, fingerprint in block if fingerprint}
+    )
+    stored: set[str] = set()
+    if fingerprints:
+        try:
+            redis_instance = await RedisConnection.connect()
+            counts = await redis_instance.hmget(_fingerprint_counts_key(user_id), fingerprints)
+            stored = {f for f, count in zip(fingerprints, counts) if count and int(count) > 0}
+        except Exception as e:
+            print(f"Error reading paragraph fingerprints: {e}")
+
+    kept: list[str] = []
+    dropped = 0
+    for block in blocks:
+        fingerprinted = [fingerprint for _, fingerprint in block if fingerprint]
+        known = [fingerprint for fingerprint in fingerprinted if fingerprint in stored]
+        if fingerprinted and len(known) / len(fingerprinted) >= STORED_HISTORY_RATIO:
+            dropped += 1
+            continue
+        remaining = [paragraph for paragraph, fingerprint in block if fingerprint not in stored]
+        if remaining:
+            kept.append("\n\n".join(remaining))
+    return kept, dropped
+
+
+async def normalize_email_body(
+    user_id: str,
+    text_body: Optional[str],
+    html_body: Optional[str],
+    filter_stored_history: bool = True,
+) -> NormalizationReport:
+    """
+    Text of an email worth embedding.
+    Uses the HTML body when the TextBody is a stub, drops signatures and footers, and drops
+    quoted/forwarded history the user already saved. Large bodies are parsed in the process pool.
+    filter_stored_history=False keeps all history.
+    """
+    body_chars = len(text_body or "") + len(html_body or "")
+    if body_chars > TEXT_PREP_PROCESS_THRESHOLD_CHARS:
+        parts: EmailParts = await TextPreparationPool.run(
+            prepare_email_parts, text_body, html_body
+        )
+    else:
+        parts = prepare_email_parts(text_body, html_body)
+
+    if filter_stored_history:
+        history, history_blocks_removed = await _filter_stored_history(user_id, parts.history)
+    else:
+        history, history_blocks_removed = parts.history, 0
+    text = "\n\n".join(part for part in [parts.own_text, *history] if part)
+
+    chars_removed = max(0, parts.original_chars - len(text))
+    chunks_removed = max(0, estimate_chunks(parts.original_chars) - estimate_chunks(len(text)))
+    await incr_metric(NORMALIZATION_METRIC, "emails")
+    await incr_metric(NORMALIZATION_METRIC, "chars_removed", chars_removed)
+    await incr_metric(NORMALIZATION_METRIC, "chunks_removed", chunks_removed)
+    return NormalizationReport(
+        text=text,
+        source=parts.source,
+        chars_removed=chars_removed,
+        chunks_removed=chunks_removed,
+        history_blocks_removed=history_blocks_removed,
+    )
+
+
+async def remember_paragraphs(user_id: str, email_ref_id: str, fingerprints: list[str]) -> None:
+    """
+    Record the paragraph fingerprints of an embedded email so later replies quoting it are
+    recognised. Call once its chunks are written, recording an email again changes nothing.
+    """
+    if not fingerprints:
+        return
+    try:
+        redis_instance = await RedisConnection.connect()
+        await redis_instance.eval(
+            _REMEMBER_SCRIPT,
+            2,
+            _email_fingerprints_key(user_id, email_ref_id),
+            _fingerprint_counts_key(user_id),
+            *dict.fromkeys(fingerprints),
+        )
+    except Exception as e:
+        print(f"Error writing paragraph fingerprints: {e}")
+
+
+async def forget_paragraphs(user_id: str, email_ref_ids: list[str]) -> None:
+    """
+    Call when emails are deleted or embedded again, removes what remember_paragraphs
+    recorded for them. Paragraphs other emails still contain stay known.
+    """
+    try:
+        redis_instance = await RedisConnection.connect()
+        for email_ref_id in email_ref_ids:
+            await redis_instance.eval(
+                _FORGET_SCRIPT,
+                2,
+                _email_fingerprints_key(user_id, email_ref_id),
+                _fingerprint_counts_key(user_id),
+            )
+    except Exception as e:
+        print(f"Error removing paragraph fingerprints: {e}")
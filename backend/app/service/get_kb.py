@@ -1,5 +1,8 @@
-from app.gemini.get_embeddings import get_embeddings
-from app.lance_db import vector_search, VectorSearchResult
+from app.gemini.get_embeddings import get_query_embedding
+from app.lance_db import VectorSearchResult
+from app.service.hybrid_search import hybrid_search
+from app.service.context_builder import build_context, get_email_metadata
+from app.service.mmr import KB_MMR_ENABLED, KB_MMR_FETCH_K, mmr_rerank
 from typing import List
 
 
@@ -12,28 +15,51 @@ async def get_kb(question: str, user_id: str) -> str:
     Returns:
         A string containing the relevant context from the knowledge base
     """
+    context, _ = await get_kb_with_sources(question, user_id)
+    return context
+
+
+async def get_kb_with_sources(
+    question: str, user_id: str
+) -> tuple[str, list[VectorSearchResult]]:
+    """
+    Same as get_kb but also returns the chunks the context was built from
+    Returns:
+        (context, search results in the context, best first)
+    """
     try:
-        # Get embeddings for the question
-        question_embedding: list[float] = await get_embeddings(question)
+        # Get embeddings for the question, repeat questions are served from cache
+        question_embedding: list[float] = await get_query_embedding(question)
         
-        # Search the vector database
-        search_results: list[VectorSearchResult] = await vector_search(
-            table_name=user_id,
-            query_vector=question_embedding,
-            limit=6  # Get top 6 most relevant chunks
-        )
+        # Keyword + vector search over the user's table
+        if KB_MMR_ENABLED:
+            # Over-fetch and keep a diverse top 6, so near-identical emails don't crowd out the rest
+            candidates: list[VectorSearchResult] = await hybrid_search(
+                table_name=user_id,
+                query_text=question,
+                query_vector=question_embedding,
+                limit=KB_MMR_FETCH_K,
+                with_vectors=True,
+            )
+            search_results: list[VectorSearchResult] = mmr_rerank(candidates, k=6)
+        else:
+            search_results = await hybrid_search(
+                table_name=user_id,
+                query_text=question,
+                query_vector=question_embedding,
+                limit=6  # Get top 6 most relevant chunks
+            )
         
         # If no results found, return empty string
         if not search_results:
-            return ""
-            
-        # Sort results by chunk sequence to maintain original order
-        sorted_results: list[VectorSearchResult] = sorted(search_results, key=lambda x: int(x.chunk_sequence))
-        
-        # Combine the text from all results
-        context: str = "\n".join(result.text for result in sorted_results)
-        
-        return context
+            return "", []
+
+        # One section per email, best match first, overlapping chunks merged
+        email_ref_ids: list[str] = list(dict.fromkeys(result.email_ref_id for result in search_results))
+        email_metadata = await get_email_metadata(user_id, email_ref_ids)
+        context, used_results = build_context(search_results, email_metadata)
+
+        return context, used_results
     except Exception as e:
         print(f"Error in get_kb: {e}")
-        return ""
+        return "", []
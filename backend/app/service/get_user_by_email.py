@@ -1,26 +1,32 @@
-from typing import Optional
-import asyncpg
+from typing import Any, Optional
 from app.database.database import Database
+from app.service.user_cache import UserCache, user_record_to_dict
 
 
 
 
-async def get_user_by_email(email: str) -> asyncpg.Record:
+async def get_user_by_email(email: str) -> Optional[dict[str, Any]]:
     """
     Service function to get a user by their email address
+    Served from UserCache when possible, unknown emails always go to Postgres.
     
     Args:
         email: User's email address
         
     Returns:
-        asyncpg.Record: The user record
-        
-    Raises:
-        UserNotFoundError: If user with this email is not found
+        dict: The user (id, email, name, created_at, updated_at), or None if not found
     """
+    cached_user = await UserCache.get(email)
+    if cached_user is not None:
+        return cached_user
+
     user = await Database.fetchrow(
         "SELECT id, email, name, created_at, updated_at FROM users WHERE email = $1", 
         email
     )
-    
-    return user 
\ No newline at end of file
+    if not user:
+        return None
+
+    user_data = user_record_to_dict(user)
+    await UserCache.set(user_data)
+    return user_data
@@ -0,0 +1,87 @@
+import asyncio
+import os
+from typing import List, Optional
+from app.lance_db import vector_search, full_text_search, VectorSearchResult
+
+
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_FTS_WEIGHT = float(os.getenv("HYBRID_FTS_WEIGHT", "1.0"))
+# The usual RRF constant, dampens the advantage of the very top ranks
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Keyword search runs alongside vector search, if it is slower than this it is dropped
+# so hybrid search stays within the single query latency budget
+HYBRID_FTS_TIMEOUT_SECONDS = float(os.getenv("HYBRID_FTS_TIMEOUT_MS", "150")) / 1000
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: List[List[VectorSearchResult]],
+    weights: List[float],
+    limit: int,
+    k: int = HYBRID_RRF_K,
+) -> List[VectorSearchResult]:
+    """
+    Fuse several ranked result lists, each chunk scores sum(weight / (k + rank)).
+    Chunks are identified by (email_ref_id, attachment_name, chunk_sequence).
+    The fused score is set on the returned results.
+    """
+    scores: dict[tuple[str, Optional[str], int], float] = {}
+    chunks: dict[tuple[str, Optional[str], int], VectorSearchResult] = {}
+    for results, weight in zip(ranked_lists, weights):
+        for rank, result in enumerate(results, start=1):
+            key = (result.email_ref_id, result.attachment_name, result.chunk_sequence)
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+            chunks.setdefault(key, result)
+
+    best_keys = sorted(scores, key=lambda key: scores[key], reverse=True)[:limit]
+    for key in best_keys:
+        chunks[key].score = scores[key]
+    return [chunks[key] for key in best_keys]
+
+
+async def hybrid_search(
+    table_name: str,
+    query_text: str,
+    query_vector: List[float],
+    limit: int = 6,
+    with_vectors: bool = False,
+) -> List[VectorSearchResult]:
+    """
+    Run vector and keyword search concurrently and fuse them with reciprocal rank fusion.
+    Falls back to vector results only when hybrid search is disabled or keyword search
+    fails, times out or finds nothing.
+    with_vectors loads the chunk embeddings into the results.
+    """
+    # Over-fetch a bit so fusion has something to work with
+    candidates = limit * 2
+    vector_task = asyncio.create_task(
+        vector_search(
+            table_name=table_name,
+            query_vector=query_vector,
+            limit=candidates,
+            with_vectors=with_vectors,
+        )
+    )
+    if not HYBRID_SEARCH_ENABLED:
+        return (await vector_task)[:limit]
+
+    try:
+        fts_results = await asyncio.wait_for(
+            full_text_search(
+                table_name, query_text, limit=candidates, with_vectors=with_vectors
+            ),
+            timeout=HYBRID_FTS_TIMEOUT_SECONDS,
+        )
+    except asyncio.TimeoutError:
+        print("Full text search timed out, using vector results only")
+        fts_results = []
+    vector_results = await vector_task
+
+    if not fts_results:
+        return vector_results[:limit]
+
+    return reciprocal_rank_fusion(
+        [vector_results, fts_results],
+        [HYBRID_VECTOR_WEIGHT, HYBRID_FTS_WEIGHT],
+        limit,
+    )
@@ -0,0 +1,89 @@
+import os
+from typing import List
+import numpy as np
+from app.lance_db import VectorSearchResult
+
+
+KB_MMR_ENABLED = os.getenv("KB_MMR_ENABLED", "true").lower() == "true"
+# 1.0 ranks by relevance only, lower values favour chunks unlike the ones already picked
+KB_MMR_LAMBDA = float(os.getenv("KB_MMR_LAMBDA", "0.7"))
+# Candidates fetched before re-ranking
+KB_MMR_FETCH_K = int(os.getenv("KB_MMR_FETCH_K", "30"))
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    return matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-10)
+
+
+def search_relevance(results: List[VectorSearchResult]) -> np.ndarray:
+    """
+    Relevance of each result in [0, 1], min-max normalized so the gaps between scores are kept.
+    Uses the fused hybrid search score, exact keyword hits with a weak vector similarity
+    (order numbers, names) stay near the top. Results of a vector only search use their distance.
+    """
+    scores = np.array(
+        [
+            result.score if result.score is not None else -(result.distance or 0.0)
+            for result in results
+        ],
+        dtype=np.float32,
+    )
+    spread = scores.max() - scores.min()
+    if spread <= 0:
+        return np.ones(len(results), dtype=np.float32)
+    return (scores - scores.min()) / spread
+
+
+def mmr_select(
+    relevance: np.ndarray,
+    candidate_vectors: np.ndarray,
+    k: int,
+    lambda_mult: float = KB_MMR_LAMBDA,
+) -> List[int]:
+    """
+    Maximal marginal relevance over a candidate matrix.
+    Each step picks argmax(lambda * relevance(c) - (1 - lambda) * max sim(c, picked)).
+    All similarities are computed up front, the greedy loop only does O(n) vector ops per pick.
+    Args:
+        relevance: Relevance of each candidate in [0, 1]
+    Returns:
+        Indexes of the picked candidates, in pick order
+    """
+    num_candidates = candidate_vectors.shape[0]
+    if num_candidates == 0:
+        return []
+    k = min(k, num_candidates)
+
+    candidates = _normalize_rows(candidate_vectors.astype(np.float32, copy=False))
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[:, selected[0]].copy()
+    available = np.ones(num_candidates, dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[:, best], out=max_similarity)
+    return selected
+
+
+def mmr_rerank(
+    results: List[VectorSearchResult],
+    k: int,
+    lambda_mult: float = KB_MMR_LAMBDA,
+) -> List[VectorSearchResult]:
+    """
+    Re-rank search results of hybrid_search loaded with vectors.
+    Results without a vector are dropped.
+    """
+    with_vectors = [(result, result.vector) for result in results if result.vector is not None]
+    if not with_vectors:
+        return []
+    results = [result for result, _vector in with_vectors]
+    candidate_vectors = np.stack([vector for _result, vector in with_vectors])
+    picked = mmr_select(search_relevance(results), candidate_vectors, k, lambda_mult)
+    return [results[index] for index in picked]
@@ -0,0 +1,100 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+import asyncpg
+from app.database.redis_connect import RedisConnection
+from app.helpers.metrics import incr_buffered_metric, incr_metric
+
+
+USER_CACHE_LRU_SIZE = int(os.getenv("USER_CACHE_LRU_SIZE", "2000"))
+# In-process entries are not invalidated across processes, keep them short lived
+USER_CACHE_LOCAL_TTL_SECONDS = float(os.getenv("USER_CACHE_LOCAL_TTL_SECONDS", "30"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", str(60 * 60)))
+USER_CACHE_METRIC = "user_cache"
+
+
+def _user_cache_key(email: str) -> str:
+    return f"user:email:{email}"
+
+
+def user_record_to_dict(user: asyncpg.Record) -> dict[str, Any]:
+    return {
+        "id": str(user["id"]),
+        "email": user["email"],
+        "name": user["name"],
+        "created_at": user["created_at"].isoformat() if user["created_at"] else None,
+        "updated_at": user["updated_at"].isoformat() if user["updated_at"] else None,
+    }
+
+
+class UserCache:
+    """
+    Two tier cache of users by email.
+    A small in-process TTL/LRU in front of Redis, only existing users are cached.
+    """
+
+    _lru: OrderedDict[str, tuple[dict[str, Any], float]] = OrderedDict()
+
+    @classmethod
+    def _lru_get(cls, email: str) -> Optional[dict[str, Any]]:
+        cached = cls._lru.get(email)
+        if cached is None:
+            return None
+        user, expires_at = cached
+        if time.monotonic() > expires_at:
+            del cls._lru[email]
+            return None
+        cls._lru.move_to_end(email)
+        return user
+
+    @classmethod
+    def _lru_set(cls, email: str, user: dict[str, Any]) -> None:
+        cls._lru[email] = (user, time.monotonic() + USER_CACHE_LOCAL_TTL_SECONDS)
+        cls._lru.move_to_end(email)
+        while len(cls._lru) > USER_CACHE_LRU_SIZE:
+            cls._lru.popitem(last=False)
+
+    @classmethod
+    async def get(cls, email: str) -> Optional[dict[str, Any]]:
+        user = cls._lru_get(email)
+        if user is not None:
+            incr_buffered_metric(USER_CACHE_METRIC, "lru_hits")
+            return user
+        try:
+            redis_instance = await RedisConnection.connect()
+            value = await redis_instance.get(_user_cache_key(email))
+            if value:
+                user = json.loads(value)
+                cls._lru_set(email, user)
+                incr_buffered_metric(USER_CACHE_METRIC, "redis_hits")
+                return user
+        except Exception as e:
+            print(f"Error reading user cache: {e}")
+        await incr_metric(USER_CACHE_METRIC, "misses")
+        return None
+
+    @classmethod
+    async def set(cls, user: dict[str, Any]) -> None:
+        cls._lru_set(user["email"], user)
+        try:
+            redis_instance = await RedisConnection.connect()
+            await redis_instance.setex(
+                _user_cache_key(user["email"]), USER_CACHE_TTL_SECONDS, json.dumps(user)
+            )
+        except Exception as e:
+            print(f"Error writing user cache: {e}")
+
+    @classmethod
+    async def invalidate(cls, email: str) -> None:
+        """
+        Call after a user is created or updated.
+        Other processes may serve their in-process copy for up to USER_CACHE_LOCAL_TTL_SECONDS.
+        """
+        cls._lru.pop(email, None)
+        try:
+            redis_instance = await RedisConnection.connect()
+            await redis_instance.delete(_user_cache_key(email))
+        except Exception as e:
+            print(f"Error invalidating user cache: {e}")
@@ -0,0 +1,3 @@
+-- Rollback for 002_emails_user_created_at_index.sql migration
+
+DROP INDEX IF EXISTS idx_emails_user_id_created_at;
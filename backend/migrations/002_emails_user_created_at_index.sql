@@ -0,0 +1,4 @@
+-- Index backing the keyset paginated email list (GET /kb/)
+-- id breaks ties between emails created at the same timestamp
+CREATE INDEX IF NOT EXISTS idx_emails_user_id_created_at
+ON emails (user_id, created_at DESC, id DESC);
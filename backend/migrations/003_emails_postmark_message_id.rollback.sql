@@ -0,0 +1,4 @@
+-- Rollback for 003_emails_postmark_message_id.sql migration
+
+DROP INDEX IF EXISTS idx_emails_postmark_message_id;
+ALTER TABLE emails DROP COLUMN IF EXISTS postmark_message_id;
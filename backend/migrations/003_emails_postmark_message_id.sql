@@ -0,0 +1,5 @@
+-- Postmark MessageID of inbound emails, a retried inbound job finds the email
+-- it already saved instead of creating a second row
+ALTER TABLE emails ADD COLUMN IF NOT EXISTS postmark_message_id VARCHAR(255);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_emails_postmark_message_id
+ON emails (postmark_message_id);
@@ -0,0 +1,73 @@
+import random
+import statistics
+import sys
+import time
+from app.helpers.minhash import (
+    minhash_signature,
+    signature_similarity,
+    lsh_band_keys,
+)
+
+
+EMAIL_CHARS = 100_000
+RUNS = 50
+
+WORDS = (
+    "invoice meeting project deadline budget review contract schedule report update "
+    "customer delivery payment quarter forecast approval team design release agenda"
+).split()
+
+
+def random_email(chars: int) -> str:
+    words: list[str] = []
+    length = 0
+    while length < chars:
+        word = random.choice(WORDS) + str(random.randint(0, 500))
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def modified_copy(text: str, share: float) -> str:
+    """Replace a share of the words, spread over the whole email"""
+    words = text.split()
+    for index in random.sample(range(len(words)), int(len(words) * share)):
+        words[index] = "changed" + str(index)
+    return " ".join(words)
+
+
+def main() -> None:
+    """
+    Times minhash_signature on a large email and shows the similarity estimate
+    and LSH candidate match for modified copies.
+    Usage: python script_for_dedupe_benchmark.py [email_chars]
+    """
+    chars = int(sys.argv[1]) if len(sys.argv) > 1 else EMAIL_CHARS
+    email = random_email(chars)
+    minhash_signature(email)  # warm up
+
+    latencies: list[float] = []
+    for _ in range(RUNS):
+        started_at = time.perf_counter()
+        signature = minhash_signature(email)
+        latencies.append((time.perf_counter() - started_at) * 1000)
+    latencies.sort()
+    print(
+        f"{chars} chars, {RUNS} runs: "
+        f"p50={statistics.median(latencies):.2f}ms "
+        f"p95={latencies[int(len(latencies) * 0.95)]:.2f}ms"
+    )
+
+    bands = set(lsh_band_keys(signature))
+    for share in (0.0, 0.01, 0.05, 0.2, 0.5):
+        copy_signature = minhash_signature(modified_copy(email, share))
+        shared_bands = len(bands & set(lsh_band_keys(copy_signature)))
+        print(
+            f"{share:.0%} words changed: "
+            f"estimated similarity={signature_similarity(signature, copy_signature):.2f} "
+            f"shared_bands={shared_bands}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import sys
+import uuid
+from pathlib import Path
+import pyarrow as pa
+from app.lance_db import (
+    LanceConnection,
+    SharedTextEmbeddingSchema,
+    DB_PATH,
+    get_shared_table_name,
+    is_shared_table_name,
+)
+from app.background_jobs.index_manager import (
+    iter_table_names,
+    ensure_scalar_index,
+    get_scalar_index_columns,
+)
+
+
+PROGRESS_FILE = Path(DB_PATH).parent / "layout_migration_progress.txt"
+
+
+def is_user_table_name(table_name: str) -> bool:
+    try:
+        return str(uuid.UUID(table_name)) == table_name
+    except ValueError:
+        return False
+
+
+def read_progress() -> set[str]:
+    if not PROGRESS_FILE.exists():
+        return set()
+    return set(PROGRESS_FILE.read_text().split())
+
+
+def mark_done(table_name: str) -> None:
+    with PROGRESS_FILE.open("a") as progress:
+        progress.write(f"{table_name}\n")
+
+
+async def migrate_user_table(user_id: str) -> int:
+    """
+    Copy one per-user table into its shared table, batch by batch.
+    Any rows of the user already in the shared table (from an interrupted run) are
+    deleted first, so re-running a table never duplicates chunks.
+    Returns:
+        Number of rows copied
+    """
+    source = await LanceConnection.get_table(user_id)
+    target_name = get_shared_table_name(user_id)
+    target = await LanceConnection.get_table(target_name)
+    target_schema: pa.Schema = SharedTextEmbeddingSchema.to_arrow_schema()
+
+    await target.delete(where=f"user_id = '{user_id}'")
+    copied = 0
+    reader = await source.query().to_batches()
+    async for batch in reader:
+        if batch.num_rows == 0:
+            continue
+        batch = batch.append_column(
+            "user_id", pa.array([user_id] * batch.num_rows, type=pa.string())
+        )
+        await target.add(pa.Table.from_batches([batch]).select(target_schema.names))
+        copied += batch.num_rows
+    return copied
+
+
+async def migrate(drop_source: bool) -> None:
+    """
+    Offline migration from the per-user layout to the shared layout.
+    Stop the API and worker first, writes during the copy would be lost.
+    Progress is kept in PROGRESS_FILE so an interrupted run resumes where it stopped.
+    """
+    db = await LanceConnection.connect()
+    done = read_progress()
+    user_tables = [
+        name
+        async for name in iter_table_names(db)
+        if not is_shared_table_name(name) and is_user_table_name(name)
+    ]
+    print(f"{len(user_tables)} per-user tables, {len(done)} already migrated")
+
+    shared_tables: set[str] = set()
+    for index, user_id in enumerate(user_tables, start=1):
+        shared_tables.add(get_shared_table_name(user_id))
+        if user_id in done:
+            continue
+        copied = await migrate_user_table(user_id)
+        mark_done(user_id)
+        print(f"[{index}/{len(user_tables)}] {user_id}: {copied} rows")
+        if drop_source:
+            await db.drop_table(user_id)
+
+    for table_name in sorted(shared_tables):
+        for column in get_scalar_index_columns(table_name):
+            action = await ensure_scalar_index(table_name, column)
+            print(f"{column} index {action} for table {table_name}")
+    print("✅ Lance layout migration completed, set LANCE_STORAGE_LAYOUT=shared")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Move per-user LanceDB tables into the shared multi-tenant tables"
+    )
+    parser.add_argument(
+        "--drop-source",
+        action="store_true",
+        help="Drop each per-user table once it has been copied",
+    )
+    args = parser.parse_args()
+    try:
+        await migrate(args.drop_source)
+    except Exception as e:
+        print(f"❌ Error migrating Lance layout: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        await LanceConnection.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
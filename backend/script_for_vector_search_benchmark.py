@@ -0,0 +1,104 @@
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+import lancedb
+import numpy as np
+from app.lance_db import (
+    TextEmbeddingSchema,
+    VectorSearchResult,
+    SEARCH_RESULT_COLUMNS,
+    search_results_from_arrow,
+)
+from app.gemini.get_embeddings import GEMINI_EMBEDDING_DIMENSIONS
+
+
+# Flat scan, no vector index is built
+NUM_ROWS = 5000
+RUNS = 200
+
+
+def random_vector() -> list[float]:
+    return [random.random() for _ in range(GEMINI_EMBEDDING_DIMENSIONS)]
+
+
+async def pandas_path(table: lancedb.AsyncTable, vector: list[float], limit: int):
+    """The previous implementation, kept here for comparison"""
+    results = await (
+        table.vector_search(vector).select(SEARCH_RESULT_COLUMNS).limit(limit).to_pandas()
+    )
+    # Nullable columns such as attachment_name come back as NaN
+    results = results.replace({np.nan: None})
+    return [VectorSearchResult.model_validate(row) for row in results.to_dict("records")]
+
+
+async def arrow_path(table: lancedb.AsyncTable, vector: list[float], limit: int):
+    results = await (
+        table.vector_search(vector).select(SEARCH_RESULT_COLUMNS).limit(limit).to_arrow()
+    )
+    return search_results_from_arrow(results)
+
+
+async def measure(name: str, search, table, limit: int) -> None:
+    vectors = [random_vector() for _ in range(RUNS)]
+    await search(table, vectors[0], limit)  # warm up
+
+    latencies: list[float] = []
+    for vector in vectors:
+        started_at = time.perf_counter()
+        await search(table, vector, limit)
+        latencies.append((time.perf_counter() - started_at) * 1000)
+
+    # Allocations are measured separately, tracemalloc slows everything down
+    tracemalloc.start()
+    for vector in vectors[:20]:
+        await search(table, vector, limit)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    print(
+        f"limit={limit:<4} {name:<7} "
+        f"p50={statistics.median(latencies):.2f}ms "
+        f"p95={latencies[int(len(latencies) * 0.95)]:.2f}ms "
+        f"peak_alloc={peak / 1024:.0f}KiB"
+    )
+
+
+async def main() -> None:
+    """
+    Compares the old pandas result path of vector_search with the Arrow one
+    on a throwaway table (flat scan, so both paths do the same search work).
+    Usage: python script_for_vector_search_benchmark.py [num_rows]
+    """
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_ROWS
+    with tempfile.TemporaryDirectory() as db_path:
+        db = await lancedb.connect_async(db_path)
+        table = await db.create_table("benchmark", schema=TextEmbeddingSchema)
+        created_at = datetime.now()
+        await table.add(
+            [
+                {
+                    "id": str(uuid.uuid4()),
+                    "email_ref_id": str(uuid.uuid4()),
+                    "vector": random_vector(),
+                    "text": f"chunk {index} " * 40,
+                    "chunk_sequence": index % 10,
+                    "created_at": created_at,
+                }
+                for index in range(num_rows)
+            ]
+        )
+        print(f"{num_rows} rows, {RUNS} queries per case")
+        for limit in (6, 100):
+            await measure("pandas", pandas_path, table, limit)
+            await measure("arrow", arrow_path, table, limit)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -21,6 +21,8 @@ interface Email {
 const Dashboard = () => {
   const navigate = useNavigate();
   const [emails, setEmails] = useState<Email[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [selectedEmail, setSelectedEmail] = useState<EmailContent | null>(null);
   const [isModalOpen, setIsModalOpen] = useState(false);
   const [loading, setLoading] = useState(true);
@@ -42,6 +44,7 @@ const Dashboard = () => {
       setLoading(true);
       const response = await emailAPI.getEmailList();
       setEmails(response.emails || []);
+      setNextCursor(response.next_cursor || null);
     } catch (error) {
       console.error('Error fetching emails:', error);
     } finally {
@@ -49,6 +52,20 @@ const Dashboard = () => {
     }
   };
 
+  const fetchMoreEmails = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const response = await emailAPI.getEmailList(nextCursor);
+      setEmails((previous) => [...previous, ...(response.emails || [])]);
+      setNextCursor(response.next_cursor || null);
+    } catch (error) {
+      console.error('Error fetching more emails:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleEmailClick = async (emailId: string) => {
     try {
       setEmailLoading(true);
@@ -220,6 +237,17 @@ const Dashboard = () => {
                     </div>
                   </div>
                 ))}
+                {nextCursor && (
+                  <div className="px-6 py-3 text-center">
+                    <button
+                      onClick={fetchMoreEmails}
+                      disabled={loadingMore}
+                      className="text-sm font-medium text-sky-600 hover:text-sky-800 disabled:opacity-50"
+                    >
+                      {loadingMore ? 'Loading...' : 'Load more'}
+                    </button>
+                  </div>
+                )}
               </div>
             )}
           </div>
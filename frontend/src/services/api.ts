@@ -67,9 +67,9 @@ export default api;
 
 // Email API endpoints
 export const emailAPI = {
-  // Get list of emails for the authenticated user
-  getEmailList: async () => {
-    const response = await api.get('/kb/');
+  // Get a page of emails for the authenticated user, pass next_cursor as before for the next page
+  getEmailList: async (before?: string) => {
+    const response = await api.get('/kb/', { params: before ? { before } : {} });
     return response.data;
   },
 